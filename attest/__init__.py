@@ -1,5 +1,7 @@
 from attest.deprecated import *
 from attest.hook       import *
+from attest.numeric    import *
 from attest.reporters  import *
+from attest.resultlog  import *
 from attest.contexts   import *
 from attest.collectors import *
@@ -290,6 +290,35 @@ def walk(node):
         yield node
 
 
+class _VisitorType(type):
+    """Gives every visitor class its own cache of visitor functions and
+    clears the caches of a class and its subclasses when visitor methods are
+    assigned to or deleted from it.
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super(_VisitorType, cls).__init__(name, bases, namespace)
+        # Maps node types to the name and function of their visitor
+        type.__setattr__(cls, '_attest_visitors', {})
+
+    def __setattr__(cls, name, value):
+        type.__setattr__(cls, name, value)
+        _clear_visitors(cls, name)
+
+    def __delattr__(cls, name):
+        type.__delattr__(cls, name)
+        _clear_visitors(cls, name)
+
+
+def _clear_visitors(cls, name):
+    if name.startswith('visit_') or name == 'get_visitor':
+        classes = [cls]
+        while classes:
+            cls = classes.pop()
+            cls._attest_visitors.clear()
+            classes.extend(cls.__subclasses__())
+
+
 class NodeVisitor(object):
     """Walks the abstract syntax tree and call visitor functions for every
     node found.  The visitor functions may return values which will be
@@ -304,8 +333,15 @@ class NodeVisitor(object):
     Don't use the `NodeVisitor` if you want to apply changes to nodes during
     traversing.  For this a special visitor exists (`NodeTransformer`) that
     allows modifications.
+
+    Visitor functions are looked up once per node type and visitor class,
+    unless `get_visitor` is overridden.  The lookups are cached on the class
+    and dropped when visitor methods are assigned to it or its bases later.
+    Visitor methods assigned to an instance are respected too.
     """
 
+    __metaclass__ = _VisitorType
+
     def get_visitor(self, node):
         """Return the visitor function for this node or `None` if no visitor
         exists for this node.  In that case the generic visit function is
@@ -316,9 +352,16 @@ class NodeVisitor(object):
 
     def visit(self, node):
         """Visit a node."""
-        f = self.get_visitor(node)
-        if f is not None:
-            return f(node)
+        try:
+            name, f = self._attest_visitors[node.__class__]
+        except KeyError:
+            name, f = _find_visitor(self.__class__, node.__class__)
+        if f is _custom_visitor or name in self.__dict__:
+            f = self.get_visitor(node)
+            if f is not None:
+                return f(node)
+        elif f is not None:
+            return f(self, node)
         return self.generic_visit(node)
 
     def generic_visit(self, node):
@@ -332,6 +375,26 @@ class NodeVisitor(object):
                 self.visit(value)
 
 
+def _function(method):
+    """The function of an unbound method."""
+    return getattr(method, 'im_func', method)
+
+
+_default_get_visitor = _function(NodeVisitor.get_visitor)
+_custom_visitor = object()
+
+
+def _find_visitor(cls, node_type):
+    name = 'visit_' + node_type.__name__
+    if _function(cls.get_visitor) is not _default_get_visitor:
+        # Respect custom lookups
+        f = _custom_visitor
+    else:
+        f = _function(getattr(cls, name, None))
+    cls._attest_visitors[node_type] = name, f
+    return name, f
+
+
 class NodeTransformer(NodeVisitor):
     """Walks the abstract syntax tree and allows modifications of nodes.
 
@@ -9,7 +9,7 @@
     :license: BSD.
 """
 from attest.ast import (BINOP_SYMBOLS, BOOLOP_SYMBOLS, CMPOP_SYMBOLS,
-                        UNARYOP_SYMBOLS, NodeVisitor)
+                        UNARYOP_SYMBOLS, NodeVisitor, If, Name)
 
 
 def to_source(node, indent_with=' ' * 4, add_line_information=False):
@@ -458,10 +458,11 @@ class SourceGenerator(NodeVisitor):
             self.visit(node.value)
 
     def visit_Lambda(self, node):
-        self.write('lambda ')
+        self.write('(lambda ')
         self.signature(node.args)
         self.write(': ')
         self.visit(node.body)
+        self.write(')')
 
     def visit_Ellipsis(self, node):
         self.write('Ellipsis')
@@ -490,11 +491,13 @@ class SourceGenerator(NodeVisitor):
         self.write('}')
 
     def visit_IfExp(self, node):
+        self.write('(')
         self.visit(node.body)
         self.write(' if ')
         self.visit(node.test)
         self.write(' else ')
         self.visit(node.orelse)
+        self.write(')')
 
     def visit_Starred(self, node):
         self.write('*')
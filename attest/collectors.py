@@ -4,13 +4,15 @@ from __future__ import with_statement
 import inspect
 import re
 import sys
+import threading
 
 from contextlib import contextmanager
 from functools  import wraps
 from time       import time
 
 from attest           import statistics
-from attest.contexts  import capture_output
+from attest.contexts  import _capture_lines, capture_fd_output, \
+                             capture_logging, LOG_CAPACITY
 from attest.reporters import auto_reporter, AbstractReporter, TestResult
 from attest.utils     import (counter, import_dotted_name, deep_get_members,
                               nested)
@@ -20,6 +22,7 @@ __all__ = ['Tests',
            'test_if',
            'test',
            'TestBase',
+           'subtest',
           ]
 
 
@@ -273,7 +276,9 @@ class Tests(object):
 
     def run(self, reporter=auto_reporter,
             full_tracebacks=False, fail_fast=False,
-            debugger=False, no_capture=False, keyboard_interrupt=False):
+            debugger=False, no_capture=False, keyboard_interrupt=False,
+            fd_capture=False, capture_limit=None, capture_lines=None,
+            log_level=None):
         """Run all tests in this collection.
 
         :param reporter:
@@ -285,47 +290,91 @@ class Tests(object):
         :param fail_fast:
             Stop after the first failure.
         :param debugger:
-            Enter PDB when tests fail.
+            Enter PDB when tests fail. Otherwise, failures are
+            :meth:`snapshotted <attest.reporters.TestResult.snapshot>` as
+            they happen.
         :param keyboard_interrupt:
             Let KeyboardInterrupt exceptions (CTRL+C) propagate.
+        :param fd_capture:
+            Capture output with :func:`~attest.contexts.capture_fd_output`,
+            including that of C extensions and subprocesses.
+        :param capture_limit:
+            Keep at most this many bytes of the output of each test, half
+            from the start and half from the end.
+        :param capture_lines:
+            Likewise keep at most this many lines of output, and records
+            of the log rather than
+            :data:`~attest.contexts.LOG_CAPACITY`.
+        :param log_level:
+            Level of the root logger while tests run. Records logged by
+            tests are captured with :func:`~attest.contexts.capture_logging`
+            unless `no_capture` is set, and kept only for failures.
 
         .. versionchanged:: 0.6 Added `full_tracebacks` and `fail_fast`.
 
+        .. versionchanged:: 0.6
+            Added `fd_capture`, `capture_limit` and `capture_lines`.
+
+        .. versionchanged:: 0.6 Logging is captured, added `log_level`.
+
         """
         assertions, statistics.assertions = statistics.assertions, 0
         if not isinstance(reporter, AbstractReporter):
             reporter = reporter()
         reporter.begin(self._tests)
+        if fd_capture:
+            capture = capture_fd_output
+        else:
+            capture = _capture_lines
+        limits = dict(limit=capture_limit, max_lines=capture_lines)
+        log_capacity = capture_lines
+        if log_capacity is None:
+            log_capacity = LOG_CAPACITY
         for test in self:
             result = TestResult(test=test, full_tracebacks=full_tracebacks,
                                 debugger=debugger)
+            running = _Running(result, no_capture, capture, limits,
+                               log_level, log_capacity)
+            stack = _running()
+            stack.append(running)
             result.time = time()
             try:
-                out, err = [], []
+                out, err, logs = [], [], []
                 if no_capture:
                     if test() is False:
                         raise AssertionError('test() is False')
                 else:
-                    with capture_output() as (out, err):
-                        if test() is False:
-                            raise AssertionError('test() is False')
+                    with capture(**limits) as (out, err):
+                        with capture_logging(log_level, log_capacity) \
+                                as logs:
+                            if test() is False:
+                                raise AssertionError('test() is False')
             except KeyboardInterrupt:
                 if keyboard_interrupt:
                     raise
-                else:
-                    break
+                # The subtests that finished are reported all the same
+                _report(reporter, running.results)
+                break
             except BaseException, e:
                 result.time = time() - result.time
                 result.error = e
                 result.stdout, result.stderr = out, err
+                result.logs = logs
                 result.exc_info = sys.exc_info()
-                reporter.failure(result)
-                if fail_fast:
-                    break
+                if not debugger:
+                    result.snapshot()
             else:
                 result.time = time() - result.time
                 result.stdout, result.stderr = out, err
-                reporter.success(result)
+            finally:
+                stack.pop()
+            # Subtests are reported once the test has finished, so that
+            # reporters don't write into the output captured for the test
+            results = running.results + [result]
+            _report(reporter, results)
+            if fail_fast and any(result.error is not None
+                                 for result in results):
+                break
         try:
             reporter.finished()
         finally:
@@ -364,6 +413,99 @@ class Tests(object):
         main(self)
 
 
+class _Running(object):
+    """The settings and subtest results of a test being run by
+    :meth:`Tests.run`.
+
+    """
+
+    def __init__(self, result, no_capture, capture, limits, log_level,
+                 log_capacity):
+        self.result = result
+        self.no_capture = no_capture
+        self.capture = capture
+        self.limits = limits
+        self.log_level = log_level
+        self.log_capacity = log_capacity
+        self.results = []
+
+
+_running_local = threading.local()
+
+
+def _running():
+    """The tests being run in the current thread, innermost last."""
+    try:
+        return _running_local.stack
+    except AttributeError:
+        stack = _running_local.stack = []
+        return stack
+
+
+def _report(reporter, results):
+    for result in results:
+        if result.error is None:
+            reporter.success(result)
+        else:
+            reporter.failure(result)
+
+
+@contextmanager
+def subtest(name):
+    """Run the block as a subtest named `name` of the running test. The
+    subtest is reported as a result of its own, with its own timing,
+    captured output and failure, and a failure doesn't stop the test. One
+    expensive setup can thus drive many independently reported checks::
+
+        @suite.test
+        def conversions():
+            for value, expected in CASES:
+                with subtest(repr(value)):
+                    assert convert(value) == expected
+
+    The results are reported when the test has finished, before that of the
+    test itself, and are named like the test with ``[name]`` appended.
+    Outside of a test run by :meth:`Tests.run` in the current thread, the
+    block simply runs.
+
+    .. versionadded:: 0.6
+
+    """
+    stack = _running()
+    if not stack:
+        yield
+        return
+    running = stack[-1]
+    parent = running.result
+    result = TestResult(test=parent.test, subtest=name,
+                        full_tracebacks=parent.full_tracebacks,
+                        debugger=parent.debugger)
+    result.time = time()
+    out, err, logs = [], [], []
+    try:
+        if running.no_capture:
+            yield
+        else:
+            with running.capture(**running.limits) as (out, err):
+                with capture_logging(running.log_level,
+                                     running.log_capacity) as logs:
+                    yield
+    except KeyboardInterrupt:
+        raise
+    except BaseException, e:
+        result.time = time() - result.time
+        result.error = e
+        result.stdout, result.stderr = out, err
+        result.logs = logs
+        result.exc_info = sys.exc_info()
+        if not result.debugger:
+            result.snapshot()
+    else:
+        result.time = time() - result.time
+        result.stdout, result.stderr = out, err
+    running.results.append(result)
+
+
 def test_if(condition):
     """Returns :func:`test` if the `condition` is ``True``.
 
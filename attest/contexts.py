@@ -1,32 +1,439 @@
+from __future__ import with_statement
+
+import logging
+import os
 import sys
+import threading
 
-from contextlib import contextmanager
-from shutil     import rmtree
-from tempfile   import mkdtemp
+from collections import deque
+from contextlib  import contextmanager
+from shutil      import rmtree
+from tempfile    import mkdtemp, mkstemp
 
 try:
     from cStringIO import StringIO
 except ImportError:
     from StringIO  import StringIO
 
+# Subclassable, unlike the faster cStringIO
+from StringIO import StringIO as _StringIO
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    ContextVar = None
+
 from attest            import statistics
 from attest.deprecated import _repr
+from attest.hook       import TestFailures, _soft_failures
 
 
 __all__ = ['capture_output',
+           'capture_fd_output',
+           'CapturedLines',
+           'truncate_lines',
+           'capture_logging',
+           'CapturedLog',
            'disable_imports',
            'Error',
            'raises',
+           'soft_assertions',
            'tempdir',
            'warns',
           ]
 
 
+#: Captured output larger than this many bytes is kept in a temporary file
+#: rather than in memory by :func:`capture_fd_output`.
+SPILL_SIZE = 1024 * 1024
+
+#: Replaces output dropped by capture limits, formatted with the amount and
+#: the unit.
+TRUNCATED = '... [%d %s truncated] ...'
+
+#: Default format of records captured by :func:`capture_logging`.
+LOG_FORMAT = '%(levelname)s %(name)s: %(message)s'
+
+#: Default number of records kept by :func:`capture_logging`.
+LOG_CAPACITY = 1000
+
+
+class CapturedLines(object):
+    """Read-only sequence of the lines of some captured output, which
+    compares equal to a list of the same lines. The output is only split
+    into lines when first used, and output that was spilled to a temporary
+    file is read back from it on demand.
+
+    :param max_lines: If the output has more lines than this, only the
+        first and last half of them are kept, separated by a
+        :data:`TRUNCATED` marker.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, text=None, filename=None, max_lines=None):
+        self._text = text
+        self._filename = filename
+        self._lines = None
+        self.max_lines = max_lines
+
+    def _fill(self, text=None, filename=None):
+        self._text = text
+        self._filename = filename
+
+    @property
+    def spilled(self):
+        """:const:`True` if the output is kept in a temporary file."""
+        return self._filename is not None
+
+    def _iter_file(self):
+        with open(self._filename, 'rb') as f:
+            for line in f:
+                yield _decode(line).rstrip('\r\n')
+
+    def _iter_lines(self):
+        if self._filename is not None:
+            lines = self._iter_file()
+        else:
+            lines = _decode(self._text or '').splitlines()
+        if self.max_lines is None:
+            return iter(lines)
+        return truncate_lines(lines, self.max_lines)
+
+    @property
+    def lines(self):
+        """The lines as a :class:`list`."""
+        if self._lines is None:
+            self._lines = list(self._iter_lines())
+        return self._lines
+
+    def __iter__(self):
+        if self._lines is None and self._filename is not None:
+            return self._iter_lines()
+        return iter(self.lines)
+
+    def __len__(self):
+        if self._lines is None and self._filename is not None:
+            return sum(1 for line in self._iter_lines())
+        return len(self.lines)
+
+    def __getitem__(self, index):
+        return self.lines[index]
+
+    def __nonzero__(self):
+        if self._lines is not None:
+            return bool(self._lines)
+        return self._filename is not None or bool(self._text)
+
+    def __eq__(self, other):
+        if isinstance(other, CapturedLines):
+            other = other.lines
+        return self.lines == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self.lines)
+
+    def __del__(self):
+        if self._filename is not None:
+            try:
+                os.remove(self._filename)
+            except (AttributeError, OSError, TypeError):
+                # The os module may be torn down at interpreter shutdown
+                pass
+
+
+def _decode(s):
+    if not isinstance(s, str):
+        return s.decode('utf-8', 'replace')
+    return s
+
+
+def truncate_lines(lines, max_lines):
+    """Iterate over `lines`, keeping only the first and last half of
+    `max_lines` if there are more, separated by a :data:`TRUNCATED`
+    marker. Uses memory for at most half of `max_lines`.
+
+    .. versionadded:: 0.6
+
+    """
+    head = max_lines - max_lines // 2
+    tail_size = max_lines // 2
+    tail = deque()
+    dropped = 0
+    for index, line in enumerate(lines):
+        if index < head:
+            yield line
+            continue
+        tail.append(line)
+        if len(tail) > tail_size:
+            tail.popleft()
+            dropped += 1
+    if dropped:
+        yield TRUNCATED % (dropped, 'lines')
+    for line in tail:
+        yield line
+
+
+def _join_truncated(head, dropped, tail):
+    if head and not head.endswith('\n'):
+        head += '\n'
+    return '%s%s\n%s' % (head, TRUNCATED % (dropped, 'bytes'), tail)
+
+
+class _BoundedBuffer(_StringIO):
+    """File-like object keeping the first and last half of `limit` bytes
+    written to it.
+
+    """
+
+    #: Like the standard streams when they aren't attached to a terminal.
+    encoding = None
+
+    def __init__(self, limit):
+        _StringIO.__init__(self)
+        self.head_size = limit - limit // 2
+        self.tail_size = limit // 2
+        self.head = []
+        self.head_length = 0
+        self.tail = deque()
+        self.tail_length = 0
+        self.dropped = 0
+
+    def write(self, s):
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+        if self.head_length < self.head_size:
+            chunk = s[:self.head_size - self.head_length]
+            self.head.append(chunk)
+            self.head_length += len(chunk)
+            s = s[len(chunk):]
+        if len(s) > self.tail_size:
+            self.dropped += len(s) - self.tail_size
+            s = s[len(s) - self.tail_size:]
+        if not s:
+            return
+        self.tail.append(s)
+        self.tail_length += len(s)
+        while self.tail and \
+                self.tail_length - len(self.tail[0]) >= self.tail_size:
+            chunk = self.tail.popleft()
+            self.tail_length -= len(chunk)
+            self.dropped += len(chunk)
+
+    def fileno(self):
+        raise IOError('captured output has no file descriptor')
+
+    def getvalue(self):
+        head, tail = ''.join(self.head), ''.join(self.tail)
+        excess = len(tail) - self.tail_size
+        if excess > 0:
+            tail = tail[excess:]
+        dropped = self.dropped + max(excess, 0)
+        if not dropped:
+            return head + tail
+        return _join_truncated(head, dropped, tail)
+
+
+class _Capture(object):
+    """An active :func:`capture_output` or :func:`capture_logging`
+    context.
+
+    """
+
+    def __init__(self, parent, buffers=None, log=None):
+        self.parent = parent
+        self.buffers = buffers
+        self.log = log
+        self.closed = False
+        self.lock = threading.Lock()
+        self.routers = []
+
+
+def _owning_capture(kind):
+    """The innermost open capture of the current thread or task with a
+    `kind` attribute set.
+
+    """
+    capture = _current_capture()
+    while capture is not None and \
+            (capture.closed or getattr(capture, kind) is None):
+        capture = capture.parent
+    return capture
+
+
+class _Router(object):
+    """Installed as :data:`sys.stdout` or :data:`sys.stderr` while output
+    is captured, forwarding to the capture that owns the current thread or
+    task, or to the `fallback` stream if there is none.
+
+    """
+
+    softspace = 0
+
+    def __init__(self, fallback, index):
+        self.fallback = fallback
+        self.index = index
+        self.users = 0
+
+    def _capture(self):
+        return _owning_capture('buffers')
+
+    def write(self, s):
+        capture = self._capture()
+        if capture is None:
+            self.fallback.write(s)
+            return
+        with capture.lock:
+            capture.buffers[self.index].write(s)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        capture = self._capture()
+        if capture is None:
+            self.fallback.flush()
+
+    def __getattr__(self, name):
+        capture = self._capture()
+        if capture is None:
+            return getattr(self.fallback, name)
+        return getattr(capture.buffers[self.index], name)
+
+
+class _LogRouter(logging.Handler):
+    """Installed on the root logger while logging is captured, adding
+    records to the capture that owns the thread or task logging them.
+    Records logged elsewhere are left to the other handlers.
+
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.users = 0
+
+    def handle(self, record):
+        if not self.filter(record):
+            return
+        capture = _owning_capture('log')
+        if capture is None:
+            return
+        with capture.lock:
+            capture.log._append(record)
+
+    def emit(self, record):
+        pass
+
+
+if ContextVar is not None:
+    _capture_var = ContextVar('attest_capture', default=None)
+    _get_capture, _set_capture = _capture_var.get, _capture_var.set
+else:
+    _capture_local = threading.local()
+
+    def _get_capture():
+        return getattr(_capture_local, 'capture', None)
+
+    def _set_capture(capture):
+        _capture_local.capture = capture
+
+
+# threading.current_thread is new in Python 2.6
+_current_thread = getattr(threading, 'current_thread', None) or \
+        threading.currentThread
+
+
+def _current_capture():
+    """The capture of the current task or thread, or of the thread that
+    started the current thread.
+
+    """
+    capture = _get_capture()
+    if capture is None:
+        thread = _current_thread()
+        capture = getattr(thread, '_attest_capture', None)
+    return capture
+
+
+_active_captures = 0
+_routing_lock = threading.Lock()
+_log_router = None
+
+#: The wrappers installed as :meth:`threading.Thread.start` while output or
+#: logging is captured, and the functions they replaced.
+_thread_starts = []
+
+
+def _wrap_thread_start():
+    original = vars(threading.Thread)['start']
+
+    def start(thread):
+        thread._attest_capture = _current_capture()
+        return original(thread)
+
+    threading.Thread.start = start
+    _thread_starts.append((start, original))
+
+
+def _unwrap_thread_start():
+    start, original = _thread_starts.pop()
+    # Leave alone whatever replaced the wrapper since, and so wraps it
+    if vars(threading.Thread).get('start') is start:
+        threading.Thread.start = original
+
+
+def _push_capture(buffers=None, log=None):
+    global _active_captures, _log_router
+    capture = _Capture(_current_capture(), buffers, log)
+    with _routing_lock:
+        if buffers is not None:
+            for index, name in enumerate(('stdout', 'stderr')):
+                router = getattr(sys, name)
+                if not isinstance(router, _Router):
+                    router = _Router(router, index)
+                    setattr(sys, name, router)
+                router.users += 1
+                capture.routers.append(router)
+        if log is not None:
+            if _log_router is None:
+                _log_router = _LogRouter()
+                logging.getLogger().addHandler(_log_router)
+            _log_router.users += 1
+        if not _active_captures:
+            _wrap_thread_start()
+        _active_captures += 1
+    _set_capture(capture)
+    return capture
+
+
+def _pop_capture(capture):
+    global _active_captures, _log_router
+    capture.closed = True
+    _set_capture(capture.parent)
+    with _routing_lock:
+        for name, router in zip(('stdout', 'stderr'), capture.routers):
+            router.users -= 1
+            if not router.users and getattr(sys, name) is router:
+                setattr(sys, name, router.fallback)
+        if capture.log is not None:
+            _log_router.users -= 1
+            if not _log_router.users:
+                logging.getLogger().removeHandler(_log_router)
+                _log_router = None
+        _active_captures -= 1
+        if not _active_captures:
+            _unwrap_thread_start()
+
+
 @contextmanager
-def capture_output():
+def capture_output(limit=None, max_lines=None):
     """Captures standard output and error during the context. Returns a
-    tuple of the two streams as lists of lines, added after the context has
-    executed.
+    tuple of two lists of lines, added after the context has executed.
 
     .. testsetup::
 
@@ -38,16 +445,255 @@ def capture_output():
     >>> out
     ['Captured']
 
+    Output is attributed to the thread that entered the context, and to
+    threads it starts while inside it, so that contexts in concurrently
+    running threads capture only their own output. Where
+    :mod:`contextvars` is available, tasks are kept apart in the same way.
+    Output from other threads passes through.
+
+    To that end, while any output or logging is captured
+    :data:`sys.stdout` and :data:`sys.stderr` are replaced and
+    :meth:`threading.Thread.start` is wrapped for the whole process. The
+    originals are put back when the last capture ends, unless they have
+    been replaced again in the meantime.
+
+    :param limit: Keep only the first and last half of this many bytes of
+        each stream, separated by a :data:`TRUNCATED` marker.
+    :param max_lines: Likewise limit the number of lines of each stream.
+
+    .. versionchanged:: 0.6 Added `limit` and `max_lines`.
+
+    .. versionchanged:: 0.6 Output is routed by thread.
+
     """
-    stdout, stderr = sys.stdout, sys.stderr
-    sys.stdout, sys.stderr = StringIO(), StringIO()
     out, err = [], []
+    # Nothing was captured if setting up the capture fails
+    out_lines = err_lines = ()
     try:
+        with _capture_lines(limit, max_lines) as (out_lines, err_lines):
+            yield out, err
+    finally:
+        out.extend(out_lines)
+        err.extend(err_lines)
+
+
+@contextmanager
+def _capture_lines(limit=None, max_lines=None):
+    """Like :func:`capture_output` but returning :class:`CapturedLines`,
+    which are only split into lines when used.
+
+    """
+    if limit is None:
+        buffers = StringIO(), StringIO()
+    else:
+        buffers = _BoundedBuffer(limit), _BoundedBuffer(limit)
+    out = CapturedLines(max_lines=max_lines)
+    err = CapturedLines(max_lines=max_lines)
+    capture = _push_capture(buffers=buffers)
+    try:
+        yield out, err
+    finally:
+        _pop_capture(capture)
+        out._fill(buffers[0].getvalue())
+        err._fill(buffers[1].getvalue())
+
+
+@contextmanager
+def capture_fd_output(spill_size=SPILL_SIZE, limit=None, max_lines=None):
+    """Like :func:`capture_output` but redirects the file descriptors of
+    standard output and error to temporary files, capturing also the
+    output of C extensions and subprocesses. Output up to `spill_size`
+    bytes is read into memory after the context, anything larger is kept
+    on disk until the lines are used. With a `limit`, only that many
+    bytes are ever read back from each file.
+
+    Because file descriptors are shared by the whole process, output is
+    not routed by thread as with :func:`capture_output`.
+
+    .. versionadded:: 0.6
+
+    """
+    out = CapturedLines(max_lines=max_lines)
+    err = CapturedLines(max_lines=max_lines)
+    saved = []
+    try:
+        _flush_standard_streams()
+        for target, lines in ((1, out), (2, err)):
+            fd, filename = mkstemp(prefix='attest-')
+            saved.append((target, os.dup(target), fd, filename, lines))
+            os.dup2(fd, target)
         yield out, err
     finally:
-        out.extend(sys.stdout.getvalue().splitlines())
-        err.extend(sys.stderr.getvalue().splitlines())
-        sys.stdout, sys.stderr = stdout, stderr
+        _flush_standard_streams()
+        for target, original, fd, filename, lines in saved:
+            os.dup2(original, target)
+            os.close(original)
+            size = os.fstat(fd).st_size
+            if limit is not None and size > limit:
+                tail_size = limit // 2
+                head = _read(fd, 0, limit - tail_size)
+                tail = _read(fd, size - tail_size, tail_size)
+                text = _join_truncated(head, size - limit, tail)
+            elif size > spill_size:
+                os.close(fd)
+                lines._fill(filename=filename)
+                continue
+            else:
+                text = _read(fd, 0, size)
+            os.close(fd)
+            os.remove(filename)
+            lines._fill(text)
+
+
+def _read(fd, offset, size):
+    os.lseek(fd, offset, os.SEEK_SET)
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def _flush_standard_streams():
+    for stream in (sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__):
+        try:
+            stream.flush()
+        except (AttributeError, ValueError):
+            pass
+
+
+class CapturedLog(object):
+    """Read-only sequence of the records logged in a
+    :func:`capture_logging` context, as formatted lines. The raw
+    :class:`~logging.LogRecord` objects are kept until the lines are first
+    used, so nothing is formatted unless the log is looked at.
+
+    :param capacity: Keep only the first and last half of this many
+        records, replacing the others with a :data:`TRUNCATED` marker, or
+        all records if :const:`None`.
+    :param format: Format string for a :class:`~logging.Formatter`.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, capacity=LOG_CAPACITY, format=LOG_FORMAT):
+        self.formatter = logging.Formatter(format)
+        self.capacity = capacity
+        self._head = []
+        self._tail = deque()
+        self._lines = None
+        #: Number of records dropped because of the `capacity`.
+        self.dropped = 0
+
+    def _append(self, record):
+        if self.capacity is None or \
+                len(self._head) < self.capacity - self.capacity // 2:
+            self._head.append(record)
+            return
+        self._tail.append(record)
+        if len(self._tail) > self.capacity // 2:
+            self._tail.popleft()
+            self.dropped += 1
+
+    @property
+    def records(self):
+        """The kept :class:`~logging.LogRecord` objects, empty after
+        :meth:`release`.
+
+        """
+        return self._head + list(self._tail)
+
+    @property
+    def lines(self):
+        """The formatted lines as a :class:`list`."""
+        if self._lines is None:
+            lines = []
+            for record in self._head:
+                lines.extend(self.formatter.format(record).splitlines())
+            if self.dropped:
+                lines.append(TRUNCATED % (self.dropped, 'records'))
+            for record in self._tail:
+                lines.extend(self.formatter.format(record).splitlines())
+            self._lines = lines
+        return self._lines
+
+    def release(self):
+        """Format the records and drop them, releasing the arguments and
+        tracebacks they refer to.
+
+        """
+        self.lines
+        self._head = []
+        self._tail.clear()
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __getitem__(self, index):
+        return self.lines[index]
+
+    def __nonzero__(self):
+        if self._lines is not None:
+            return bool(self._lines)
+        return bool(self._head)
+
+    def __eq__(self, other):
+        if isinstance(other, CapturedLog):
+            other = other.lines
+        return self.lines == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self.lines)
+
+
+@contextmanager
+def capture_logging(level=None, capacity=LOG_CAPACITY, format=LOG_FORMAT):
+    """Captures the records logged with :mod:`logging` during the context,
+    returning them as a :class:`CapturedLog`. Records are attributed to
+    threads and tasks in the same way as output is by
+    :func:`capture_output`, and are still passed to any other handlers.
+
+    .. testsetup::
+
+        from attest import capture_logging
+        import logging
+
+    >>> with capture_logging() as log:
+    ...     logging.getLogger('app').warning('Captured')
+    ...
+    >>> log
+    ['WARNING app: Captured']
+
+    :param level: Set the level of the root logger to this during the
+        context, to capture records it would otherwise ignore.
+    :param capacity: Limit the number of records kept, see
+        :class:`CapturedLog`.
+
+    .. versionadded:: 0.6
+
+    """
+    log = CapturedLog(capacity, format)
+    root = logging.getLogger()
+    old_level = root.level
+    if level is not None:
+        root.setLevel(level)
+    capture = _push_capture(log=log)
+    try:
+        yield log
+    finally:
+        _pop_capture(capture)
+        if level is not None:
+            root.setLevel(old_level)
 
 
 @contextmanager
@@ -144,6 +790,49 @@ def raises(*exceptions):
         raise AssertionError("didn't raise %s when expected" % _repr(exceptions))
 
 
+@contextmanager
+def soft_assertions():
+    """Collect the assertions that fail inside the context rather than
+    stopping at the first one, and fail with all of them at the end, so
+    that expensive setup can be checked in full by one run::
+
+        with soft_assertions():
+            assert response.status == 200
+            assert response.headers['Content-Type'] == 'text/plain'
+            assert response.body == 'OK'
+
+    This works for rewritten ``assert`` statements,
+    :func:`~attest.hook.assert_hook` and :func:`~attest.hook.assert_all`.
+    Failures in nested contexts are passed on to the outer one. If another
+    exception ends the context, the failures so far are kept as its
+    ``soft_failures`` attribute and reported with it.
+
+    :returns: The list of failures so far.
+    :raises ~attest.hook.TestFailures: If any assertion failed.
+
+    .. versionadded:: 0.6
+
+    """
+    failures = []
+    stack = _soft_failures()
+    stack.append(failures)
+    try:
+        yield failures
+    except BaseException, e:
+        stack.pop()
+        if stack:
+            stack[-1].extend(failures)
+        elif failures:
+            e.soft_failures = failures
+        raise
+    stack.pop()
+    if failures:
+        if stack:
+            stack[-1].extend(failures)
+        else:
+            raise TestFailures(failures)
+
+
 @contextmanager
 def tempdir(*args, **kwargs):
     """Creates a temporary directory, removing it and everything in it when
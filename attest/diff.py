@@ -0,0 +1,293 @@
+from difflib   import SequenceMatcher
+from itertools import islice
+from time      import time
+
+from attest.numeric  import approx, is_array, mismatches
+from attest.saferepr import saferepr, _elide
+
+
+__all__ = ['Differences',
+           'diff',
+           'DIFFERS',
+          ]
+
+
+#: Length of sequences compared with :class:`difflib.SequenceMatcher` after
+#: their common ends are removed, when they also differ in length. Longer
+#: differing stretches are shown as a single difference.
+MATCH_SIZE = 1000
+
+#: Number of characters shown around the first difference of strings.
+CONTEXT = 30
+
+#: Maximum size of rendered items.
+ITEM_SIZE = 200
+
+
+class Differences(object):
+    """Collects the differences between two values, found by one of the
+    :data:`DIFFERS`, as diff-like lines. Only the first `limit` differences
+    are kept and the search stops once it has taken `timeout` seconds.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, limit=10, timeout=1.0):
+        self.limit = limit
+        self.timeout = timeout
+        if timeout is not None:
+            self.deadline = time() + timeout
+        else:
+            self.deadline = None
+        self.summary = None
+        self.lines = []
+        self.count = 0
+        self.stopped = False
+
+    @property
+    def expired(self):
+        """:const:`True`, and :attr:`stopped` set, once the time is up."""
+        if self.deadline is not None and time() > self.deadline:
+            self.stopped = True
+        return self.stopped
+
+    def add(self, where, removed=(), added=(), render=None):
+        """Record a difference at `where`, with the items only in the left
+        value and those only in the right one.
+
+        """
+        self.count += 1
+        if self.count > self.limit:
+            return
+        if render is None:
+            render = _render
+        self.lines.append('@@ %s @@' % where)
+        for sign, items in (('-', removed), ('+', added)):
+            for item in islice(items, self.limit):
+                self.lines.append('%s %s' % (sign, render(item)))
+            if len(items) > self.limit:
+                self.lines.append('%s <%d more>' % (sign,
+                                                    len(items) - self.limit))
+
+    def __str__(self):
+        lines = []
+        if self.summary is not None:
+            lines.append(self.summary)
+        lines.extend(self.lines)
+        if self.count > self.limit:
+            lines.append('<%d more differences>' % (self.count - self.limit))
+        if self.stopped:
+            lines.append('<stopped after %.1f seconds>' % self.timeout)
+        return '\n'.join(lines) + '\n'
+
+
+def _render(item):
+    return saferepr(item, ITEM_SIZE)
+
+
+def _render_line(line):
+    return _elide(line.rstrip('\r\n'), ITEM_SIZE)
+
+
+def _key(item):
+    """A hashable stand-in for `item` for :class:`~difflib.SequenceMatcher`.
+
+    """
+    try:
+        hash(item)
+    except TypeError:
+        return _render(item)
+    return item
+
+
+def diff_sequences(differences, left, right, noun='items', render=None):
+    """Compare the items of the sequences `left` and `right` in one pass
+    when they have the same length, or otherwise match up the stretch
+    between their common ends.
+
+    """
+    n, m = len(left), len(right)
+    if n == m:
+        differences.summary = '%s differ' % noun.capitalize()
+        for i in xrange(n):
+            if not i & 1023 and differences.expired:
+                return
+            if not left[i] == right[i]:
+                differences.add('[%d]' % i, left[i:i + 1], right[i:i + 1],
+                                render)
+        return
+
+    differences.summary = '%d != %d %s' % (n, m, noun)
+    shortest = min(n, m)
+    start = 0
+    while start < shortest and left[start] == right[start]:
+        if not start & 1023 and differences.expired:
+            return
+        start += 1
+    end = 0
+    while end < shortest - start and left[n - end - 1] == right[m - end - 1]:
+        if not end & 1023 and differences.expired:
+            return
+        end += 1
+    removed, added = left[start:n - end], right[start:m - end]
+
+    if len(removed) > MATCH_SIZE or len(added) > MATCH_SIZE:
+        differences.add('[%d:%d] != [%d:%d]' % (start, n - end,
+                                                start, m - end),
+                        removed, added, render)
+        return
+    matcher = SequenceMatcher(None, map(_key, removed), map(_key, added))
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            differences.add('[%d:%d] != [%d:%d]' % (start + i1, start + i2,
+                                                    start + j1, start + j2),
+                            removed[i1:i2], added[j1:j2], render)
+
+
+def diff_dicts(differences, left, right):
+    """Compare the keys and values of the dicts `left` and `right`."""
+    if len(left) == len(right):
+        differences.summary = 'Dicts differ'
+    else:
+        differences.summary = '%d != %d keys' % (len(left), len(right))
+    for i, key in enumerate(left):
+        if not i & 1023 and differences.expired:
+            return
+        where = '[%s]' % _render(key)
+        if key not in right:
+            differences.add(where, [left[key]], [])
+        elif not left[key] == right[key]:
+            differences.add(where, [left[key]], [right[key]])
+    for i, key in enumerate(right):
+        if not i & 1023 and differences.expired:
+            return
+        if key not in left:
+            differences.add('[%s]' % _render(key), [], [right[key]])
+
+
+def diff_sets(differences, left, right):
+    """Find the items only in one of the sets `left` and `right`."""
+    removed, added = list(left - right), list(right - left)
+    differences.summary = '%d only on the left, %d only on the right' % (
+        len(removed), len(added))
+    if removed:
+        differences.add('left - right', removed, [])
+    if added:
+        differences.add('right - left', [], added)
+
+
+def diff_strings(differences, left, right):
+    """Compare multi-line strings line by line, or show the first
+    difference of other strings in context.
+
+    """
+    if left == right:
+        return
+    if '\n' in left or '\n' in right:
+        return diff_sequences(differences, left.splitlines(True),
+                              right.splitlines(True), 'lines', _render_line)
+    n, m = len(left), len(right)
+    shortest = min(n, m)
+    start = 0
+    while start < shortest and left[start] == right[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and left[n - end - 1] == right[m - end - 1]:
+        end += 1
+    differences.summary = 'First difference at index %d' % start
+    first = max(0, start - CONTEXT)
+    differences.add('[%d:%d] != [%d:%d]' % (start, n - end, start, m - end),
+                    [left[first:n - end + CONTEXT]],
+                    [right[first:m - end + CONTEXT]])
+
+
+def diff_arrays(differences, left, right, compare=mismatches):
+    """Compare the elements of the NumPy arrays `left` and `right` with
+    :func:`~attest.numeric.mismatches`, or `compare`.
+
+    """
+    import numpy
+    left, right = numpy.asarray(left), numpy.asarray(right)
+    found = compare(left, right, limit=differences.limit)
+    differences.summary = str(found)
+    if found.shapes is not None:
+        differences.add('shape', [found.shapes[0]], [found.shapes[1]])
+    for index in found.indices:
+        differences.add('[%s]' % ', '.join(map(str, index)),
+                        [left[index]], [right[index]])
+
+
+def diff_approx(differences, left, right):
+    """Compare `left` to the :class:`~attest.numeric.approx` `right`."""
+    expected = right.expected
+    if is_array(left) or is_array(expected):
+        compare = lambda left, expected, limit: right.mismatches(left, limit)
+        return diff_arrays(differences, left, expected, compare)
+    if isinstance(expected, dict) and isinstance(left, dict):
+        differences.summary = 'Dicts differ'
+        for key in set(left) | set(expected):
+            where = '[%s]' % _render(key)
+            if key not in expected:
+                differences.add(where, [left[key]], [])
+            elif key not in left:
+                differences.add(where, [], [expected[key]])
+            elif not right.close(left[key], expected[key]):
+                differences.add(where, [left[key]], [expected[key]])
+    elif (isinstance(expected, (list, tuple)) and
+          isinstance(left, (list, tuple))):
+        if len(left) != len(expected):
+            differences.summary = '%d != %d items' % (len(left),
+                                                      len(expected))
+            differences.add('len()', [len(left)], [len(expected)])
+            return
+        differences.summary = 'Items differ'
+        for i, (actual, value) in enumerate(zip(left, expected)):
+            if not right.close(actual, value):
+                differences.add('[%d]' % i, [actual], [value])
+    else:
+        differences.add('value', [left], [expected])
+
+
+#: Functions that find the differences between two values of a type, by
+#: type. They're called with a :class:`Differences` instance and the two
+#: values.
+DIFFERS = {list: diff_sequences,
+           tuple: diff_sequences,
+           dict: diff_dicts,
+           set: diff_sets,
+           frozenset: diff_sets,
+           str: diff_strings,
+           unicode: diff_strings,
+          }
+
+
+def diff(left, right, limit=10, timeout=1.0):
+    """Describe the differences between `left` and `right`, two values of
+    the same type with a function in :data:`DIFFERS` or NumPy arrays, or
+    a value and an :class:`~attest.numeric.approx`, as diff-like text.
+    Each difference is shown with its position and at most `limit` items,
+    for the first `limit` differences found in at most `timeout` seconds.
+
+    :returns: The text, or :const:`None` if the values can't be compared or
+        no differences were found in time.
+
+    .. versionadded:: 0.6
+
+    """
+    if isinstance(left, approx):
+        left, right = right, left
+    if isinstance(right, approx):
+        differ = diff_approx
+    elif type(left) is not type(right):
+        return
+    elif is_array(left):
+        differ = diff_arrays
+    else:
+        differ = DIFFERS.get(type(left))
+        if differ is None:
+            return
+    differences = Differences(limit, timeout)
+    differ(differences, left, right)
+    if differences.count or differences.stopped:
+        return str(differences)
@@ -1,18 +1,32 @@
 from __future__ import with_statement
 
+import errno
 import imp
-import inspect
+import marshal
 import os
+import re
+import struct
 import sys
+import threading
+import zlib
+
+from tempfile import mkstemp
+from types    import CodeType, ModuleType
 
 from attest         import ast, statistics
-from attest.codegen import to_source, SourceGenerator
+from attest.codegen  import to_source, SourceGenerator
+from attest.numeric  import is_array
+from attest.saferepr import saferepr
+from attest.utils    import memoized_property
 
 
 __all__ = ['COMPILES_AST',
            'ExpressionEvaluator',
+           'EvaluatedExpression',
            'TestFailure',
+           'TestFailures',
            'assert_hook',
+           'assert_all',
            'AssertTransformer',
            'AssertImportHook',
           ]
@@ -26,6 +40,52 @@ else:
     COMPILES_AST = True
 
 
+#: Number of compiled and parsed expressions kept by :func:`assert_hook` and
+#: :class:`ExpressionEvaluator`. The caches are emptied when full.
+CACHE_SIZE = 1024
+
+_code_cache = {}
+_node_cache = {}
+
+
+def _compile(source, filename):
+    """Compile the expression `source`, caching the code object."""
+    key = source, filename
+    try:
+        return _code_cache[key]
+    except KeyError:
+        if len(_code_cache) >= CACHE_SIZE:
+            _code_cache.clear()
+        code = _code_cache[key] = compile(source, filename, 'eval')
+        return code
+
+
+def _parse(source):
+    """Parse the expression `source`, caching the node. Cached nodes are
+    shared and must not be modified.
+
+    """
+    try:
+        return _node_cache[source]
+    except KeyError:
+        if len(_node_cache) >= CACHE_SIZE:
+            _node_cache.clear()
+        node = _node_cache[source] = ast.parse(source).body[0].value
+        return node
+
+
+def _source(node):
+    """The source generated for the expression `node`, remembered on the
+    node.
+
+    """
+    try:
+        return node._attest_source
+    except AttributeError:
+        source = node._attest_source = to_source(node)
+        return source
+
+
 class ExpressionEvaluator(SourceGenerator):
     """Evaluates ``expr`` in the context of ``globals`` and ``locals``,
     expanding the values of variables and the results of binary operations, but
@@ -43,19 +103,57 @@ class ExpressionEvaluator(SourceGenerator):
     >>> bool(value)
     False
 
+    :param values: The values of the sub-expressions recorded by a
+        rewritten ``assert`` statement. Recorded values are used rather than
+        evaluating the sub-expressions again, and those that were never
+        evaluated, because of short-circuiting, are shown as source.
+    :param lineno: The line of the assertion, included in the name the
+        expression is compiled under for tracebacks.
+
+    The expression is true if its value is, or for NumPy arrays, like the
+    result of comparing arrays, if all their elements are.
+
+    Compiled code and parsed nodes are cached per expression, see
+    :data:`CACHE_SIZE`, and the source of sub-expressions is generated at
+    most once. Values are rendered with :func:`~attest.saferepr.saferepr`,
+    so large values are shortened and broken :meth:`__repr__` methods don't
+    hide the failure.
+
     .. versionadded:: 0.5
 
+    .. versionchanged:: 0.6 Added `values` and `lineno`.
+
     """
 
-    def __init__(self, expr, globals, locals):
+    def __init__(self, expr, globals, locals, values=None, lineno=None):
         self.expr = expr
-        # Putting locals in globals for closures
-        self.globals = dict(globals)
+        self._globals = globals
         self.locals = locals
-        self.globals.update(self.locals)
-
+        filename = globals.get('__file__') or '?'
+        if lineno is not None:
+            filename = '%s:%d' % (filename, lineno)
+        # Not the filename of the module, or tracebacks would show its
+        # first line for errors in the expression
+        self.filename = '<assert %s>' % filename
         self.result = []
-        self.node = ast.parse(self.expr).body[0].value
+        self.values = values
+        self._memo = {}
+
+    @memoized_property
+    def globals(self):
+        # Putting locals in globals for closures
+        namespace = dict(self._globals)
+        namespace.update(self.locals)
+        return namespace
+
+    @memoized_property
+    def node(self):
+        return _parse(self.expr)
+
+    @memoized_property
+    def leaves(self):
+        return dict((id(leaf), index) for index, leaf
+                    in enumerate(_leaves(self.node)))
 
     # Trigger visit after init because we don't want to
     # evaluate twice in case of a successful assert
@@ -69,23 +167,60 @@ class ExpressionEvaluator(SourceGenerator):
         return '\n'.join((self.expr, repr(self)))
 
     def __nonzero__(self):
-        return bool(eval(self.expr, self.globals, self.locals))
+        if self.values is not None:
+            return _truth(self.eval(self.node))
+        code = _compile(self.expr, self.filename)
+        if any(isinstance(const, CodeType) for const in code.co_consts):
+            return _truth(eval(code, self.globals, self.locals))
+        # Without closures the globals don't need to include the locals
+        return _truth(eval(code, self._globals, self.locals))
+
+    def snapshot(self):
+        """Get an :class:`EvaluatedExpression` with the same rendering,
+        releasing the references to the evaluation context.
+
+        .. versionadded:: 0.6
+
+        """
+        return EvaluatedExpression(self.expr, repr(self))
 
     def eval(self, node):
-        return eval(to_source(node), self.globals, self.locals)
+        if self.values is None:
+            code = _compile(_source(node), self.filename)
+            return eval(code, self.globals, self.locals)
+        # Substitute the recorded values of the leaves
+        generator = _RecordedSource(self.leaves, self.values)
+        generator.visit(node)
+        code = _compile(''.join(generator.result), self.filename)
+        names = dict((_value_name(index), value)
+                     for index, value in enumerate(self.values))
+        return eval(code, self.globals, names)
+
+    def unevaluated(self, node):
+        """:const:`True` if `node` has no recorded value to show."""
+        if self.values is None:
+            return False
+        index = self.leaves.get(id(node))
+        return index is None or self.values[index] is _UNEVALUATED
 
     def write(self, s):
         self.result.append(str(s))
 
     def visit_Name(self, node):
+        if self.unevaluated(node):
+            self.write(_source(node))
+            return
         value = self.eval(node)
         if getattr(value, '__name__', None):
             self.write(value.__name__)
         else:
-            self.write(repr(value))
+            self.write(saferepr(value))
 
     def generic_visit(self, node):
-        self.write(repr(self.eval(node)))
+        if self.unevaluated(node):
+            self.write(_source(node))
+            return
+        self.write(saferepr(self.eval(node)))
 
     visit_BinOp = visit_Subscript = generic_visit
     visit_ListComp = visit_GeneratorExp = generic_visit
@@ -93,11 +228,95 @@ class ExpressionEvaluator(SourceGenerator):
     visit_Call = visit_Attribute = generic_visit
 
 
+#: Names of the expression nodes :class:`ExpressionEvaluator` shows the
+#: value of.
+RENDERED = ('Name', 'BinOp', 'Subscript', 'ListComp', 'GeneratorExp',
+            'SetComp', 'DictComp', 'Call', 'Attribute')
+
+#: Names of the expression nodes rewritten assertions evaluate part by part,
+#: recording the values of the :data:`RENDERED` nodes in them.
+EXPLODED = ('BoolOp', 'Compare', 'UnaryOp', 'IfExp', 'Tuple', 'List',
+            'Set', 'Dict', 'Repr')
+
+
+def _leaves(node):
+    """Iterate over the :data:`RENDERED` nodes in the expression `node`
+    whose values rewritten assertions record, in a fixed order.
+
+    """
+    name = type(node).__name__
+    if name in RENDERED:
+        yield node
+    elif name in EXPLODED:
+        for child in ast.iter_child_nodes(node):
+            for leaf in _leaves(child):
+                yield leaf
+
+
+class _Unevaluated(object):
+
+    def __repr__(self):
+        return '<unevaluated>'
+
+
+#: Recorded in place of values of sub-expressions skipped by
+#: short-circuiting.
+_UNEVALUATED = _Unevaluated()
+
+
+def _value_name(index):
+    return '__attest_value_%d__' % index
+
+
+def _result_name(index):
+    return '__attest_result_%d__' % index
+
+
+class _RecordedSource(SourceGenerator):
+    """Generates source with recorded leaves replaced by names."""
+
+    def __init__(self, leaves, values):
+        SourceGenerator.__init__(self, ' ' * 4)
+        self.leaves = leaves
+        self.values = values
+
+    def visit(self, node):
+        index = self.leaves.get(id(node))
+        if index is not None and self.values[index] is not _UNEVALUATED:
+            self.write(_value_name(index))
+        else:
+            SourceGenerator.visit(self, node)
+
+
+class EvaluatedExpression(object):
+    """A picklable record of a rendered :class:`ExpressionEvaluator`,
+    without the globals and locals it was evaluated in.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, expr, rendered):
+        self.expr = expr
+        self.rendered = rendered
+
+    def __repr__(self):
+        return self.rendered
+
+    def __str__(self):
+        return '\n'.join((self.expr, self.rendered))
+
+    @property
+    def node(self):
+        return ast.parse(self.expr).body[0].value
+
+
 class TestFailure(AssertionError):
     """Extended :exc:`AssertionError` used by the assert hook.
 
     :param value: The asserted expression evaluated with
-        :class:`ExpressionEvaluator`.
+        :class:`ExpressionEvaluator`, or an :class:`EvaluatedExpression`
+        once the failure has been snapshotted.
     :param msg: Optional message passed to the assertion.
 
     .. versionadded:: 0.5
@@ -108,13 +327,77 @@ class TestFailure(AssertionError):
         self.value = value
         AssertionError.__init__(self, msg)
 
+    def __reduce__(self):
+        return type(self), (self.value,) + self.args, self.__dict__
+
+
+class TestFailures(TestFailure):
+    """Raised by :func:`~attest.contexts.soft_assertions` for the
+    assertions that failed inside it, each a :class:`TestFailure` with a
+    ``location`` attribute, the filename and line number of the assertion.
+    The :attr:`value` is that of the first failure.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, failures, msg=None):
+        if msg is None:
+            msg = '%d assertions failed' % len(failures)
+        TestFailure.__init__(self, failures[0].value, msg)
+        self.failures = failures
+
+    def __reduce__(self):
+        return type(self), (self.failures,) + self.args, self.__dict__
+
+
+def _truth(value):
+    """The truth of the test of an assertion. NumPy arrays, like the
+    results of comparing arrays, are true if all their elements are, rather
+    than raising :exc:`ValueError`.
+
+    """
+    if is_array(value):
+        return bool(value.all())
+    return bool(value)
+
+
+_soft_local = threading.local()
+
+
+def _soft_failures():
+    """The lists collecting the failures of the active
+    :func:`~attest.contexts.soft_assertions` contexts of the current thread,
+    innermost last.
+
+    """
+    try:
+        return _soft_local.failures
+    except AttributeError:
+        stack = _soft_local.failures = []
+        return stack
+
+
+def _fail(failure, depth=1):
+    """Raise `failure`, or record it if inside
+    :func:`~attest.contexts.soft_assertions`, with the location of the
+    caller `depth` frames up.
+
+    """
+    stack = _soft_failures()
+    if not stack:
+        raise failure
+    frame = sys._getframe(depth + 1)
+    failure.location = frame.f_code.co_filename, frame.f_lineno
+    stack[-1].append(failure)
+
 
 def assert_hook(expr, msg='', globals=None, locals=None):
     """Like ``assert``, but using :class:`ExpressionEvaluator`. If
     you import this in test modules and the :class:`AssertImportHook` is
     installed (which it is automatically the first time you import from
-    :mod:`attest`), ``assert`` statements are rewritten as a call to
-    this.
+    :mod:`attest`), ``assert`` statements are rewritten to use the same
+    machinery.
 
     The import must be a top-level *from* import, example::
 
@@ -125,14 +408,96 @@ def assert_hook(expr, msg='', globals=None, locals=None):
     """
     statistics.assertions += 1
     if globals is None:
-        globals = inspect.stack()[1][0].f_globals
+        globals = sys._getframe(1).f_globals
     if locals is None:
-        locals = inspect.stack()[1][0].f_locals
-    value = ExpressionEvaluator(expr, globals, locals)
+        locals = sys._getframe(1).f_locals
+    value = ExpressionEvaluator(expr, globals, locals,
+                                lineno=sys._getframe(1).f_lineno)
     if not value:
         # Visit only if assertion fails
         value.late_visit()
-        raise TestFailure(value, msg)
+        _fail(TestFailure(value, msg))
+
+
+def _assert_failed(expr, msg, values, globals, locals):
+    """Called by rewritten ``assert`` statements once the test has been
+    evaluated and found false, and only then, with the `values` recorded
+    while evaluating it.
+
+    """
+    value = ExpressionEvaluator(expr, globals, locals, values,
+                                sys._getframe(1).f_lineno)
+    value.late_visit()
+    _fail(TestFailure(value, msg))
+
+
+def assert_all(predicate, values, limit=10):
+    """Assert that `predicate` is true for every item in `values`, counting
+    an assertion per item at once. Unlike a loop of ``assert`` statements,
+    every item is checked before failing, and the failure lists the first
+    `limit` failing items and their positions::
+
+        assert_all(is_valid, rows)
+
+    For NumPy arrays `predicate` is first called with the whole array, and
+    if that gives an array of booleans of the same shape, no more calls
+    are made. Vectorized predicates like ``lambda a: a >= 0`` thus check
+    every element in one pass.
+
+    :raises TestFailure: With the number of failing items as the message.
+
+    .. versionadded:: 0.6
+
+    """
+    failed = None
+    if is_array(values):
+        result = predicate(values)
+        if (is_array(result) and result.dtype == bool and
+                result.shape == values.shape):
+            import numpy
+            count = values.size
+            failing = numpy.flatnonzero(~result)
+            indices = zip(*numpy.unravel_index(failing[:limit],
+                                               values.shape))
+            failed = [(index, values[index]) for index in indices]
+            failures = len(failing)
+    if failed is None:
+        count = failures = 0
+        failed = []
+        for index, item in enumerate(values):
+            count += 1
+            if not predicate(item):
+                failures += 1
+                if failures <= limit:
+                    failed.append((index, item))
+    statistics.assertions += count
+    if not failures:
+        return
+    name = getattr(predicate, '__name__', '')
+    if not re.match(r'[A-Za-z_]\w*$', name):
+        name = 'predicate'
+    rendered = ['%s(%s)  # [%s]' % (name, saferepr(item),
+                                    ', '.join(map(str, _tuple(index))))
+                for index, item in failed]
+    if failures > limit:
+        rendered.append('# <%d more>' % (failures - limit))
+    _fail(TestFailure(EvaluatedExpression('%s(item)' % name,
+                                          '\n'.join(rendered)),
+                      '%d of %d items failed' % (failures, count)))
+
+
+def _tuple(index):
+    if isinstance(index, tuple):
+        return tuple(int(i) for i in index)
+    return index,
+
+
+#: Names the helpers used by rewritten assertions are imported as in
+#: rewritten modules.
+STATISTICS_NAME = '__attest_statistics__'
+FAILED_NAME = '__attest_assert_failed__'
+UNEVALUATED_NAME = '__attest_unevaluated__'
+TRUTH_NAME = '__attest_truth__'
 
 
 # Build AST nodes on 2.5 more easily
@@ -143,9 +508,20 @@ def _build(node, **kwargs):
     return node
 
 
+def _name(id, ctx=None):
+    return _build(ast.Name, id=id, ctx=ctx or ast.Load())
+
+
+def _assign(name, value):
+    return _build(ast.Assign, targets=[_name(name, ast.Store())],
+                  value=value)
+
+
 class AssertTransformer(ast.NodeTransformer):
     """Parses `source` with :mod:`_ast` and transforms `assert`
-    statements into calls to :func:`assert_hook`.
+    statements to count the assertion and evaluate the test inline, calling
+    into :class:`ExpressionEvaluator` like :func:`assert_hook` only if it
+    is false. Passing assertions are thus nearly as cheap as native ones.
 
     .. warning::
 
@@ -166,19 +542,37 @@ class AssertTransformer(ast.NodeTransformer):
 
     .. versionadded:: 0.5
 
+    .. versionchanged:: 0.6
+        Passing assertions no longer call :func:`assert_hook`.
+
+    .. versionchanged:: 0.6
+        The source is parsed only once and the :attr:`node` and
+        :attr:`code` are computed only once.
+
     """
 
     def __init__(self, source, filename=''):
         self.source = source
         self.filename = filename
+        self._memo = {}
+        self._in_function = False
 
-    @property
+    @memoized_property
+    def tree(self):
+        """The parsed source, transformed in place by :attr:`node`.
+
+        .. versionadded:: 0.6
+
+        """
+        return ast.parse(self.source, self.filename)
+
+    @memoized_property
     def should_rewrite(self):
         """:const:`True` if the source imports :func:`assert_hook`."""
         return ('assert_hook' in self.source and
                 any(s.module == 'attest' and
                     any(n.name == 'assert_hook' for n in s.names)
-                    for s in ast.parse(self.source).body
+                    for s in self.tree.body
                     if isinstance(s, ast.ImportFrom)))
 
     def make_module(self, name, newpath=None):
@@ -188,32 +582,90 @@ class AssertTransformer(ast.NodeTransformer):
         :returns: The module object.
 
         """
-        module = imp.new_module(name)
-        module.__file__ = self.filename
-        if newpath:
-            module.__path__ = newpath
-        sys.modules[name] = module
-        exec self.code in vars(module)
-        return module
+        return _exec_module(name, self.filename, newpath, self.code)
 
-    @property
+    @memoized_property
     def node(self):
         """The transformed AST node."""
-        node = ast.parse(self.source, self.filename)
-        node = self.visit(node)
+        # Decide before the tree is transformed
+        self.should_rewrite
+        node = self.visit(self.tree)
         ast.fix_missing_locations(node)
         return node
 
-    @property
+    @memoized_property
     def code(self):
         """The :attr:`node` compiled into a code object."""
         if COMPILES_AST:
             return compile(self.node, self.filename, 'exec')
         return compile(to_source(self.node), self.filename, 'exec')
 
+    def visit_Module(self, node):
+        self.generic_visit(node)
+        # Import the helpers after the docstring and __future__ imports
+        index = 0
+        if node.body and isinstance(node.body[0], ast.Expr) and \
+                isinstance(node.body[0].value, ast.Str):
+            index = 1
+        while index < len(node.body) and \
+                isinstance(node.body[index], ast.ImportFrom) and \
+                node.body[index].module == '__future__':
+            index += 1
+        imports = [
+            _build(ast.Import, names=[
+                _build(ast.alias, name='attest.statistics',
+                                  asname=STATISTICS_NAME)]),
+            _build(ast.ImportFrom, module='attest.hook', level=0, names=[
+                _build(ast.alias, name='_assert_failed',
+                                  asname=FAILED_NAME),
+                _build(ast.alias, name='_UNEVALUATED',
+                                  asname=UNEVALUATED_NAME),
+                _build(ast.alias, name='_truth', asname=TRUTH_NAME)]),
+        ]
+        if index < len(node.body):
+            for statement in imports:
+                ast.copy_location(statement, node.body[index])
+        node.body[index:index] = imports
+        return node
+
+    def visit_FunctionDef(self, node):
+        return self._visit_scope(node, True)
+
+    def visit_ClassDef(self, node):
+        return self._visit_scope(node, False)
+
+    def _visit_scope(self, node, in_function):
+        outer, self._in_function = self._in_function, in_function
+        try:
+            return self.generic_visit(node)
+        finally:
+            self._in_function = outer
+
     def visit_Assert(self, node):
-        args = [_build(ast.Str, s=to_source(node.test)),
+        count = _build(ast.AugAssign,
+            target=_build(ast.Attribute,
+                value=_build(ast.Name, id=STATISTICS_NAME, ctx=ast.Load()),
+                attr='assertions', ctx=ast.Store()),
+            op=ast.Add(), value=_build(ast.Num, n=1))
+        # Evaluate the test once, recording the values of its leaves in
+        # temporary variables as they are computed
+        leaves = list(_leaves(node.test))
+        self._indexes = dict((id(leaf), index)
+                             for index, leaf in enumerate(leaves))
+        self._conditional = set()
+        self._results = 0
+        statements = []
+        test = self._explode(node.test, statements, False)
+        skippable = [_build(ast.Assign,
+                            targets=[_name(_value_name(index), ast.Store())],
+                            value=_name(UNEVALUATED_NAME))
+                     for index in sorted(self._conditional)]
+        values = _build(ast.Tuple, ctx=ast.Load(),
+                        elts=[_name(_value_name(index))
+                              for index in range(len(leaves))])
+        args = [_build(ast.Str, s=_source(node.test)),
                 node.msg if node.msg is not None else _build(ast.Str, s=''),
+                values,
                 _build(ast.Call,
                     func=_build(ast.Name, id='globals', ctx=ast.Load()),
                     args=[], keywords=[], starargs=None, kwargs=None),
@@ -221,10 +673,271 @@ class AssertTransformer(ast.NodeTransformer):
                     func=_build(ast.Name, id='locals', ctx=ast.Load()),
                     args=[], keywords=[], starargs=None, kwargs=None)
                ]
-        return ast.copy_location(
-            _build(ast.Expr, value=_build(ast.Call,
-                   func=_build(ast.Name, id='assert_hook', ctx=ast.Load()),
-                   args=args, keywords=[], starargs=None, kwargs=None)), node)
+        fail = _build(ast.Expr, value=_build(ast.Call,
+                      func=_build(ast.Name, id=FAILED_NAME, ctx=ast.Load()),
+                      args=args, keywords=[], starargs=None, kwargs=None))
+        if not isinstance(test, ast.Name):
+            result = self._result()
+            statements.append(_assign(result, test))
+            test = _name(result)
+        # Tests are mostly comparisons giving True, and only other values,
+        # like the arrays comparing NumPy arrays gives, need a call
+        passed = _build(ast.BoolOp, op=ast.Or(), values=[
+            _build(ast.Compare, left=test, ops=[ast.Is()],
+                   comparators=[_name('True')]),
+            _build(ast.Call, func=_name(TRUTH_NAME), args=[test],
+                   keywords=[], starargs=None, kwargs=None)])
+        check = _build(ast.If,
+                       test=_build(ast.UnaryOp, op=ast.Not(), operand=passed),
+                       body=[fail], orelse=[])
+        if self._in_function:
+            statements = skippable + statements + [check]
+        else:
+            # Module and class bodies would keep the temporaries, and the
+            # values in them, as globals or attributes
+            names = [_value_name(index) for index in range(len(leaves))]
+            names.extend(_result_name(index)
+                         for index in range(1, self._results + 1))
+            start = [_assign(name, _name(UNEVALUATED_NAME))
+                     for name in names]
+            end = _build(ast.Delete, targets=[_name(name, ast.Del())
+                                              for name in names])
+            statements = start + [_build(ast.TryFinally,
+                                         body=statements + [check],
+                                         finalbody=[end])]
+        statements = [count] + statements
+        # Everything is on the line of the assert, also for assertions
+        # spanning several lines, as line numbers can't decrease in the
+        # line number tables of Python 2
+        for statement in statements:
+            for child in ast.walk(statement):
+                ast.copy_location(child, node)
+        return statements
+
+    def _explode(self, node, statements, conditional):
+        """Append statements evaluating the expression `node` to
+        `statements`, storing the values of its leaves in temporary
+        variables, and return an expression for its value in terms of them.
+
+        """
+        name = type(node).__name__
+        if id(node) in self._indexes:
+            index = self._indexes[id(node)]
+            if conditional:
+                self._conditional.add(index)
+            statements.append(_build(ast.Assign, value=node,
+                targets=[_name(_value_name(index), ast.Store())]))
+            return _name(_value_name(index))
+
+        if name == 'BoolOp':
+            result = self._result()
+            value = self._explode(node.values[0], statements, conditional)
+            statements.append(_assign(result, value))
+            for child in node.values[1:]:
+                test = _name(result)
+                if isinstance(node.op, ast.Or):
+                    test = _build(ast.UnaryOp, op=ast.Not(), operand=test)
+                body = []
+                value = self._explode(child, body, True)
+                body.append(_assign(result, value))
+                statements.append(_build(ast.If, test=test, body=body,
+                                         orelse=[]))
+                statements = body
+            return _name(result)
+
+        if name == 'Compare':
+            left = self._explode(node.left, statements, conditional)
+            if len(node.ops) == 1:
+                right = self._explode(node.comparators[0], statements,
+                                      conditional)
+                return _build(ast.Compare, left=left, ops=node.ops,
+                              comparators=[right])
+            result = self._result()
+            last = len(node.ops) - 1
+            for index, (op, child) in enumerate(zip(node.ops,
+                                                    node.comparators)):
+                right = self._explode(child, statements,
+                                      conditional or index > 0)
+                if index < last and \
+                        not isinstance(right, (ast.Name, ast.Num, ast.Str)):
+                    # Chained comparisons evaluate the middle operands
+                    # only once
+                    temporary = self._result()
+                    statements.append(_assign(temporary, right))
+                    right = _name(temporary)
+                statements.append(_assign(result, _build(ast.Compare,
+                    left=left, ops=[op], comparators=[right])))
+                if index < last:
+                    body = []
+                    statements.append(_build(ast.If, test=_name(result),
+                                             body=body, orelse=[]))
+                    statements = body
+                left = right
+            return _name(result)
+
+        if name == 'IfExp':
+            result = self._result()
+            test = self._explode(node.test, statements, conditional)
+            body, orelse = [], []
+            body.append(_assign(result, self._explode(node.body, body,
+                                                      True)))
+            orelse.append(_assign(result, self._explode(node.orelse,
+                                                        orelse, True)))
+            statements.append(_build(ast.If, test=test, body=body,
+                                     orelse=orelse))
+            return _name(result)
+
+        if name == 'UnaryOp':
+            return _build(ast.UnaryOp, op=node.op,
+                          operand=self._explode(node.operand, statements,
+                                                conditional))
+
+        if name == 'Dict':
+            keys, values = [], []
+            for key, value in zip(node.keys, node.values):
+                keys.append(self._explode(key, statements, conditional))
+                values.append(self._explode(value, statements,
+                                            conditional))
+            return _build(ast.Dict, keys=keys, values=values)
+
+        if name in ('Tuple', 'List', 'Set'):
+            elts = [self._explode(elt, statements, conditional)
+                    for elt in node.elts]
+            exploded = _build(type(node), elts=elts)
+            if name != 'Set':
+                exploded.ctx = ast.Load()
+            return exploded
+
+        if name == 'Repr':
+            return _build(ast.Repr, value=self._explode(node.value,
+                                                        statements,
+                                                        conditional))
+
+        # Literals and anything else are evaluated as part of the parent
+        return node
+
+    def _result(self):
+        self._results += 1
+        return _result_name(self._results)
+
+
+def _exec_module(name, filename, newpath, code):
+    module = ModuleType(name)
+    module.__file__ = filename
+    if newpath:
+        module.__path__ = newpath
+    sys.modules[name] = module
+    exec code in vars(module)
+    return module
+
+
+#: Bumped when the rewriting changes, invalidating cached code.
+CACHE_VERSION = 2
+
+#: Cached code starts with the interpreter's bytecode magic number, the
+#: :data:`CACHE_VERSION`, a checksum of the source of the rewriter and the
+#: modification time and size of the source.
+CACHE_HEADER = struct.Struct('<4sBIII')
+
+#: Identifies the interpreter in the names of cache files.
+CACHE_TAG = getattr(getattr(sys, 'implementation', None), 'cache_tag', None) \
+            or 'python-%d%d' % sys.version_info[:2]
+
+
+def cache_filename(filename):
+    """The file the rewritten code of the source `filename` is cached in,
+    in a :file:`__pycache__` directory beside it.
+
+    .. versionadded:: 0.6
+
+    """
+    dirname, basename = os.path.split(filename)
+    basename = os.path.splitext(basename)[0]
+    return os.path.join(dirname, '__pycache__',
+                        '%s.attest-%s.pyc' % (basename, CACHE_TAG))
+
+
+_rewriter_checksum = None
+
+
+def _source_checksum(modules):
+    """A checksum of the source files of `modules`, leaving out those that
+    can't be read.
+
+    """
+    checksum = 0
+    for module in modules:
+        filename = os.path.splitext(module.__file__)[0] + '.py'
+        try:
+            with open(filename, 'rb') as f:
+                checksum = zlib.crc32(f.read(), checksum)
+        except (IOError, OSError):
+            pass
+    return checksum & 0xFFFFFFFF
+
+
+def _cache_header(stat):
+    # Cached code is also invalidated by any change to the rewriter, as
+    # CACHE_VERSION can't be relied on to be bumped for every change
+    global _rewriter_checksum
+    if _rewriter_checksum is None:
+        _rewriter_checksum = _source_checksum(
+            [sys.modules[__name__], ast, sys.modules[to_source.__module__]])
+    return CACHE_HEADER.pack(imp.get_magic(), CACHE_VERSION,
+                             _rewriter_checksum,
+                             int(stat.st_mtime) & 0xFFFFFFFF,
+                             stat.st_size & 0xFFFFFFFF)
+
+
+def read_cached_code(filename):
+    """Load the cached rewritten code for the source `filename`, if it was
+    cached for the current version of the source and interpreter.
+
+    :returns: A code object or :const:`None`.
+
+    .. versionadded:: 0.6
+
+    """
+    try:
+        header = _cache_header(os.stat(filename))
+        with open(cache_filename(filename), 'rb') as f:
+            if f.read(CACHE_HEADER.size) != header:
+                return
+            return marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return
+
+
+def write_cached_code(filename, code):
+    """Cache the rewritten `code` for the source `filename`. The cache file
+    is replaced atomically so concurrent runs never read a partial file.
+    Errors, such as a read-only directory, are ignored.
+
+    .. versionadded:: 0.6
+
+    """
+    target = cache_filename(filename)
+    try:
+        header = _cache_header(os.stat(filename))
+        try:
+            os.mkdir(os.path.dirname(target))
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, temporary = mkstemp(dir=os.path.dirname(target),
+                                prefix='.attest-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                marshal.dump(code, f)
+            if os.name == 'nt' and os.path.exists(target):
+                os.remove(target)
+            os.rename(temporary, target)
+        except:
+            os.remove(temporary)
+            raise
+    except (IOError, OSError):
+        pass
 
 
 class AssertImportHookEnabledDescriptor(object):
@@ -237,8 +950,17 @@ class AssertImportHook(object):
     """An :term:`importer` that transforms imported modules with
     :class:`AssertTransformer`.
 
+    :param cache: Cache the rewritten code of modules, see
+        :func:`cache_filename`. The cache is used while the modification
+        time and size of the source are unchanged.
+    :param prefixes: Only look at modules with these dotted names and the
+        modules inside them, leaving all other imports to the regular
+        import system without so much as a lookup.
+
     .. versionadded:: 0.5
 
+    .. versionchanged:: 0.6 Added `cache` and `prefixes`.
+
     """
 
     #: Class property, :const:`True` if the hook is enabled.
@@ -256,8 +978,33 @@ class AssertImportHook(object):
         sys.meta_path[:] = [ih for ih in sys.meta_path
                                if not isinstance(ih, cls)]
 
-    def __init__(self):
+    def __init__(self, cache=True, prefixes=None):
         self._cache = {}
+        self.cache = cache
+        self.prefixes = None
+        if prefixes is not None:
+            self.prefixes = {}
+            for prefix in prefixes:
+                root = prefix.split('.', 1)[0]
+                self.prefixes.setdefault(root, []).append(prefix)
+
+    @property
+    def writes_cache(self):
+        """:const:`True` if rewritten code is cached, which like bytecode
+        is disabled by :data:`sys.dont_write_bytecode`.
+
+        """
+        return self.cache and not getattr(sys, 'dont_write_bytecode', False)
+
+    def in_scope(self, name):
+        """:const:`True` if the module `name` matches the `prefixes`."""
+        if self.prefixes is None:
+            return True
+        prefixes = self.prefixes.get(name.split('.', 1)[0])
+        if prefixes is None:
+            return False
+        return any(name == prefix or name.startswith(prefix + '.')
+                   for prefix in prefixes)
 
     def __enter__(self):
         sys.meta_path.insert(0, self)
@@ -266,6 +1013,8 @@ class AssertImportHook(object):
         sys.meta_path.remove(self)
 
     def find_module(self, name, path=None):
+        if not self.in_scope(name):
+            return
         lastname = name.rsplit('.', 1)[-1]
         try:
             self._cache[name] = imp.find_module(lastname, path), path
@@ -282,15 +1031,26 @@ class AssertImportHook(object):
 
         if source is None:
             return imp.load_module(name, fd, fn, info)
+        # Compiled under the same name as by attest compile, which writes
+        # the same cache
+        filename = os.path.abspath(filename)
 
-        transformer = AssertTransformer(source, filename)
+        # Only rewritten modules are cached
+        code = self.cache and read_cached_code(filename) or None
+        if code is None:
+            transformer = AssertTransformer(source, filename)
 
-        if not transformer.should_rewrite:
-            fd, fn, info = imp.find_module(name.rsplit('.', 1)[-1], path)
-            return imp.load_module(name, fd, fn, info)
+            if not transformer.should_rewrite:
+                fd, fn, info = imp.find_module(name.rsplit('.', 1)[-1],
+                                               path)
+                return imp.load_module(name, fd, fn, info)
 
         try:
-            return transformer.make_module(name, newpath)
+            if code is None:
+                code = transformer.code
+                if self.writes_cache:
+                    write_cached_code(filename, code)
+            return _exec_module(name, filename, newpath, code)
         except Exception, err:
             raise ImportError('cannot import %s: %s' % (name, err))
 
@@ -0,0 +1,325 @@
+from __future__ import with_statement
+
+import os
+import sys
+import shutil
+
+from optparse       import OptionParser, make_option
+from tempfile       import TemporaryFile
+from xml.sax.saxutils import escape, unescape
+try:
+    from xml.etree import cElementTree as etree
+except ImportError:
+    from xml.etree import ElementTree as etree
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from attest.resultlog import MAGIC, read_resultlog
+
+
+__all__ = ['read_xunit',
+           'read_jsonl',
+           'read_results',
+           'XUnitWriter',
+           'JsonLinesWriter',
+           'merge',
+          ]
+
+
+#: Extra entities escaped by :class:`~attest.reporters.XUnitReporter`.
+QUOTE = {'"': '&quot;'}
+UNQUOTE = {'&quot;': '"'}
+
+#: Elements for captured output, and the corresponding record keys.
+OUTPUTS = {'system-out': 'stdout', 'system-err': 'stderr'}
+
+
+def read_xunit(file):
+    """Iterate over the test cases in an XUnit XML `file`, as written by
+    :class:`~attest.reporters.XUnitReporter`, yielding a result record for
+    each. The file is parsed incrementally so arbitrarily large files can
+    be read in bounded memory.
+
+    A result record is a :class:`dict` with the keys ``'name'`` (the full
+    dotted name of the test), ``'outcome'`` (one of ``'success'``,
+    ``'failure'`` or ``'error'``), ``'time'``, ``'type'`` (the name of the
+    exception type), ``'message'``, ``'traceback'``, ``'stdout'`` and
+    ``'stderr'`` (lists of lines).
+
+    .. versionadded:: 0.6
+
+    """
+    events = iter(etree.iterparse(file, events=('start', 'end')))
+    _, root = events.next()
+    for event, elem in events:
+        if event != 'end' or elem.tag != 'testcase':
+            continue
+        record = dict(name=elem.get('classname') or elem.get('name'),
+                      outcome='success',
+                      time=float(elem.get('time') or 0),
+                      type=None, message=None, traceback=None,
+                      stdout=[], stderr=[])
+        for child in elem:
+            if child.tag in ('failure', 'error'):
+                record['outcome'] = child.tag
+                record['type'] = child.get('type')
+                record['message'] = child.get('message')
+                text = (child.text or '').strip('\n')
+                record['traceback'] = unescape(text, UNQUOTE)
+            elif child.tag in OUTPUTS:
+                text = (child.text or '').strip('\n')
+                record[OUTPUTS[child.tag]] = \
+                        unescape(text, UNQUOTE).split('\n')
+        yield record
+        root.clear()
+
+
+def read_jsonl(file):
+    """Iterate over result records stored as JSON lines, one record per
+    line, in the same format yielded by :func:`read_xunit`.
+
+    .. versionadded:: 0.6
+
+    """
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        record.setdefault('stdout', [])
+        record.setdefault('stderr', [])
+        yield record
+
+
+#: Readers for :func:`read_results`, by format name.
+READERS = {'xunit': read_xunit,
+           'jsonl': read_jsonl,
+           'native': read_resultlog,
+          }
+
+
+def sniff_format(file):
+    """Guess the format of a results `file` from its first bytes. The file
+    is rewound afterwards.
+
+    """
+    head = file.read(512)
+    file.seek(0)
+    if head.startswith(MAGIC):
+        return 'native'
+    if head.lstrip().startswith('<'):
+        return 'xunit'
+    return 'jsonl'
+
+
+def read_results(filename, format=None):
+    """Iterate over the result records in `filename`, guessing the
+    `format` with :func:`sniff_format` unless given. See :data:`READERS` for
+    the supported formats.
+
+    .. versionadded:: 0.6
+
+    """
+    with open(filename, 'rb') as file:
+        if format is None:
+            format = sniff_format(file)
+        for record in READERS[format](file):
+            yield record
+
+
+class XUnitWriter(object):
+    """Write result records as a single XUnit test suite to `file`.
+
+    Test cases are spooled to a temporary file while totals are counted,
+    and copied into place by :meth:`close` once the header can be written,
+    so memory use doesn't grow with the number of records.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, file, name='attest', hostname=None, timestamp=None):
+        self.file = file
+        self.name = name
+        self.hostname = hostname
+        self.timestamp = timestamp
+        self.spool = TemporaryFile()
+        self.counts = dict(success=0, failure=0, error=0)
+        self.total_time = 0
+
+    def write(self, record):
+        self.counts[record['outcome']] += 1
+        self.total_time += record['time']
+        name = record['name']
+        case = '<testcase classname="%s" name="%s" time="%f"' % (
+            escape(name, QUOTE), escape(name.rsplit('.', 1)[-1], QUOTE),
+            record['time'])
+        if record['outcome'] == 'success':
+            self._write('%s />\n' % case)
+            return
+        self._write('%s>\n' % case)
+        self._write('<%s type="%s" message="%s"><![CDATA[\n' % (
+            record['outcome'],
+            escape(record['type'] or '', QUOTE),
+            escape(record['message'] or '', QUOTE)))
+        self._write(escape(record['traceback'] or '', QUOTE))
+        self._write('\n]]>\n</%s>\n' % record['outcome'])
+        for tag in sorted(OUTPUTS):
+            lines = record.get(OUTPUTS[tag])
+            if lines:
+                self._write('<%s><![CDATA[\n%s\n]]></%s>\n' % (
+                    tag, escape('\n'.join(lines), QUOTE), tag))
+        self._write('</testcase>\n')
+
+    def _write(self, s):
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+        self.spool.write(s)
+
+    def close(self):
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.file.write(('<testsuite name="%s" tests="%d" ' +
+                         'errors="%d" failures="%d" ' +
+                         'hostname="%s" timestamp="%s" time="%f">\n') % (
+                        escape(self.name, QUOTE),
+                        sum(self.counts.values()),
+                        self.counts['error'],
+                        self.counts['failure'],
+                        escape(self.hostname or 'unknown', QUOTE),
+                        escape(self.timestamp or '', QUOTE),
+                        self.total_time))
+        self.file.write('<properties />\n')
+        self.spool.seek(0)
+        shutil.copyfileobj(self.spool, self.file)
+        self.spool.close()
+        self.file.write('</testsuite>\n')
+
+
+class JsonLinesWriter(object):
+    """Write result records to `file` as JSON lines, readable with
+    :func:`read_jsonl`.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, file, **kwargs):
+        self.file = file
+
+    def write(self, record):
+        self.file.write(json.dumps(record))
+        self.file.write('\n')
+
+    def close(self):
+        pass
+
+
+#: Writers for :func:`merge`, by format name.
+WRITERS = {'xunit': XUnitWriter,
+           'jsonl': JsonLinesWriter,
+          }
+
+
+def iter_filenames(paths):
+    """Yield the filenames in `paths`, recursing into directories in
+    sorted order.
+
+    """
+    for p in paths:
+        if not os.path.isdir(p):
+            yield p
+            continue
+        for dirpath, dirnames, filenames in os.walk(p):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                yield os.path.join(dirpath, filename)
+
+
+def merge(paths, file, format='xunit', name='attest'):
+    """Combine the result files in `paths` into a single report written
+    to `file` in `format`. Directories are scanned recursively. Inputs are
+    streamed one record at a time.
+
+    :returns: The counts of each outcome as a :class:`dict`.
+
+    .. versionadded:: 0.6
+
+    """
+    filenames = list(iter_filenames(paths))
+    hostname, timestamp = _suite_metadata(filenames)
+    writer = WRITERS[format](file, name=name, hostname=hostname,
+                             timestamp=timestamp)
+    counts = dict(success=0, failure=0, error=0)
+    for filename in filenames:
+        for record in read_results(filename):
+            counts[record['outcome']] += 1
+            writer.write(record)
+    writer.close()
+    return counts
+
+
+def _suite_metadata(filenames):
+    """Find the common hostname and earliest timestamp of any XUnit files
+    among `filenames`, reading only their root element.
+
+    """
+    hostnames, timestamps = set(), []
+    for filename in filenames:
+        with open(filename, 'rb') as file:
+            if sniff_format(file) != 'xunit':
+                continue
+            for _, elem in etree.iterparse(file, events=('start',)):
+                if elem.get('hostname'):
+                    hostnames.add(elem.get('hostname'))
+                if elem.get('timestamp'):
+                    timestamps.append(elem.get('timestamp'))
+                break
+    hostname = hostnames.pop() if len(hostnames) == 1 else None
+    return hostname, min(timestamps) if timestamps else None
+
+
+def make_parser(**kwargs):
+    args = dict(
+        prog='attest merge',
+        usage='%prog [options] files...',
+        description=(
+            'Combine result files from many runs into one report. '
+            'The positional "files" are XUnit, JSON lines or result log '
+            'files, or directories scanned recursively for them.'
+        ),
+        option_list=[
+            make_option('-o', '--output',
+                metavar='FILENAME',
+                help='write the report to filename rather than stdout'
+            ),
+            make_option('-f', '--format',
+                choices=sorted(WRITERS), default='xunit',
+                help='report format, one of %s' % ', '.join(sorted(WRITERS))
+            ),
+            make_option('--name',
+                default='attest',
+                help='name of the merged test suite'
+            ),
+        ]
+    )
+    args.update(kwargs)
+    return OptionParser(**args)
+
+
+def main(argv=None, **kwargs):
+    parser = make_parser(**kwargs)
+    options, args = parser.parse_args(argv)
+    if not args:
+        parser.error('no result files given')
+    if options.output:
+        file = open(options.output, 'wb')
+    else:
+        file = sys.stdout
+    try:
+        merge(args, file, options.format, options.name)
+    finally:
+        if options.output:
+            file.close()
@@ -0,0 +1,213 @@
+from __future__ import with_statement
+
+import sys
+
+from attest.saferepr import saferepr
+
+
+__all__ = ['approx',
+           'mismatches',
+           'Mismatches',
+          ]
+
+
+def _numpy():
+    # Arrays can't exist without NumPy having been imported, so it never
+    # needs importing here
+    return sys.modules.get('numpy')
+
+
+def is_array(obj):
+    """:const:`True` if `obj` is a NumPy array.
+
+    .. versionadded:: 0.6
+
+    """
+    numpy = _numpy()
+    return numpy is not None and isinstance(obj, numpy.ndarray)
+
+
+class Mismatches(object):
+    """The elements that differ between two arrays, as found by
+    :func:`mismatches`.
+
+    .. attribute:: shapes
+
+        The shapes of the two arrays if they differ, in which case the
+        elements aren't compared, or otherwise :const:`None`.
+
+    .. attribute:: count
+
+        The number of differing elements, out of :attr:`size`.
+
+    .. attribute:: max_abs
+                   max_rel
+
+        The largest absolute and relative difference between differing
+        numbers, or :const:`None`.
+
+    .. attribute:: indices
+
+        The indices of the first differing elements, as tuples.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, size=0, count=0, max_abs=None, max_rel=None,
+                 indices=(), shapes=None):
+        self.size = size
+        self.count = count
+        self.max_abs = max_abs
+        self.max_rel = max_rel
+        self.indices = indices
+        self.shapes = shapes
+
+    @property
+    def fraction(self):
+        """The fraction of the elements that differ."""
+        if not self.size:
+            return 0.0
+        return float(self.count) / self.size
+
+    def __nonzero__(self):
+        return bool(self.count or self.shapes)
+
+    def __str__(self):
+        if self.shapes is not None:
+            return 'Shapes differ: %s != %s' % self.shapes
+        lines = ['%d of %d elements differ (%.4g%%)' % (
+            self.count, self.size, self.fraction * 100)]
+        if self.max_abs is not None:
+            lines.append('Largest absolute difference: %.6g' % self.max_abs)
+        if self.max_rel is not None:
+            lines.append('Largest relative difference: %.6g' % self.max_rel)
+        return '\n'.join(lines)
+
+
+def mismatches(actual, expected, rel=0, abs=0, nan_equal=False, limit=10):
+    """Compare two arrays element by element with vectorized NumPy
+    operations, without rendering them. Numbers are equal if they're within
+    ``abs + rel * |expected|`` of each other, and other elements if they
+    compare equal.
+
+    :param nan_equal: Count NaN as equal to NaN.
+    :param limit: Number of :attr:`~Mismatches.indices` to find.
+    :returns: A :class:`Mismatches`, which is false if the arrays are equal.
+
+    .. versionadded:: 0.6
+
+    """
+    import numpy
+    actual, expected = numpy.asarray(actual), numpy.asarray(expected)
+    if actual.shape != expected.shape:
+        return Mismatches(shapes=(actual.shape, expected.shape))
+    max_abs = max_rel = None
+    if actual.dtype.kind in 'iufc' and expected.dtype.kind in 'iufc':
+        with numpy.errstate(invalid='ignore', divide='ignore',
+                            over='ignore'):
+            left, right = actual, expected
+            if left.dtype.kind in 'iu' and right.dtype.kind in 'iu':
+                # Integer arithmetic wraps around, as unsigned 1 - 2 does
+                left, right = left.astype(float), right.astype(float)
+            error = numpy.abs(left - right)
+            scale = numpy.abs(right)
+            # Equality covers infinities, where the error is NaN
+            close = (actual == expected) | (error <= abs + rel * scale)
+            if nan_equal:
+                close |= numpy.isnan(actual) & numpy.isnan(expected)
+            differing = ~close
+            error, scale = error[differing], scale[differing]
+            finite = numpy.isfinite(error)
+            if finite.any():
+                max_abs = float(error[finite].max())
+            relative = error / scale
+            finite = numpy.isfinite(relative)
+            if finite.any():
+                max_rel = float(relative[finite].max())
+    else:
+        differing = numpy.asarray(actual != expected)
+        if differing.shape != actual.shape:
+            # Element-wise comparison wasn't possible
+            differing = numpy.ones(actual.shape, dtype=bool)
+    count = int(numpy.count_nonzero(differing))
+    indices = ()
+    if count and limit:
+        flat = numpy.flatnonzero(differing)[:limit]
+        indices = zip(*numpy.unravel_index(flat, actual.shape))
+    return Mismatches(actual.size, count, max_abs, max_rel,
+                      [tuple(int(i) for i in index) for index in indices])
+
+
+class approx(object):
+    """Wraps an `expected` number, sequence or dict of numbers, or NumPy
+    array, to compare equal to values within a tolerance of it, where
+    ``abs + rel * |expected|`` is the largest allowed difference::
+
+        assert 0.1 + 0.2 == approx(0.3)
+        assert array == approx(expected, rel=1e-3)
+
+    Arrays are compared with :func:`mismatches`, giving a single
+    :class:`bool` rather than an array of them.
+
+    :param nan_equal: Count NaN as equal to NaN.
+
+    .. versionadded:: 0.6
+
+    """
+
+    # Make NumPy defer comparisons with arrays to __eq__
+    __array_ufunc__ = None
+    __array_priority__ = 100
+
+    __hash__ = None
+
+    def __init__(self, expected, rel=1e-6, abs=1e-12, nan_equal=False):
+        self.expected = expected
+        self.rel = rel
+        self.abs = abs
+        self.nan_equal = nan_equal
+
+    def __repr__(self):
+        return 'approx(%s)' % saferepr(self.expected)
+
+    def __eq__(self, actual):
+        expected = self.expected
+        if is_array(actual) or is_array(expected):
+            return not self.mismatches(actual, limit=0)
+        if isinstance(expected, dict):
+            return (isinstance(actual, dict) and
+                    set(actual) == set(expected) and
+                    all(self.close(actual[key], expected[key])
+                        for key in expected))
+        if isinstance(expected, (list, tuple)):
+            return (isinstance(actual, (list, tuple)) and
+                    len(actual) == len(expected) and
+                    all(self.close(a, e) for a, e in zip(actual, expected)))
+        return self.close(actual, expected)
+
+    def __ne__(self, actual):
+        return not self == actual
+
+    def close(self, actual, expected):
+        """:const:`True` if the numbers `actual` and `expected` are within
+        the tolerance of each other.
+
+        """
+        if actual == expected:
+            return True
+        if self.nan_equal and actual != actual and expected != expected:
+            return True
+        try:
+            tolerance = self.abs + self.rel * abs(expected)
+            return abs(actual - expected) <= tolerance
+        except TypeError:
+            return False
+
+    def mismatches(self, actual, limit=10):
+        """Compare the array `actual` to the expected one with
+        :func:`mismatches`.
+
+        """
+        return mismatches(actual, self.expected, self.rel, self.abs,
+                          self.nan_equal, limit)
@@ -0,0 +1,147 @@
+from __future__ import with_statement
+
+import os
+import sys
+
+from optparse import OptionParser, make_option
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+from attest.hook import (AssertTransformer,
+                         read_cached_code,
+                         write_cached_code)
+
+
+__all__ = ['iter_sources',
+           'compile_file',
+           'compile_paths',
+          ]
+
+
+def iter_sources(paths):
+    """Yield the Python source files in `paths`, recursing into directories
+    in sorted order and skipping hidden directories and :file:`__pycache__`.
+
+    .. versionadded:: 0.6
+
+    """
+    for p in paths:
+        if not os.path.isdir(p):
+            yield p
+            continue
+        for dirpath, dirnames, filenames in os.walk(p):
+            dirnames[:] = sorted(d for d in dirnames
+                                 if not d.startswith('.') and
+                                    d != '__pycache__')
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    yield os.path.join(dirpath, filename)
+
+
+def compile_file(filename):
+    """Rewrite the module in `filename` with
+    :class:`~attest.hook.AssertTransformer` and write the code to the cache
+    used by :class:`~attest.hook.AssertImportHook`, if the module imports
+    :func:`~attest.hook.assert_hook` and isn't cached already.
+
+    The code is compiled under the absolute path of `filename`, as by the
+    import hook.
+
+    :returns: One of ``'compiled'``, ``'cached'`` or ``'skipped'`` for
+        modules that don't need rewriting.
+
+    .. versionadded:: 0.6
+
+    """
+    filename = os.path.abspath(filename)
+    if read_cached_code(filename) is not None:
+        return 'cached'
+    with open(filename, 'U') as f:
+        source = f.read()
+    transformer = AssertTransformer(source, filename)
+    if not transformer.should_rewrite:
+        return 'skipped'
+    write_cached_code(filename, transformer.code)
+    return 'compiled'
+
+
+def _compile_file(filename):
+    try:
+        return filename, compile_file(filename), None
+    except Exception, e:
+        return filename, 'failed', '%s: %s' % (type(e).__name__, e)
+
+
+def compile_paths(paths, processes=None, errors=None):
+    """Warm the rewrite cache for the modules in `paths` with
+    :func:`compile_file`, using a pool of `processes` worker processes. By
+    default there is one per CPU, and with ``1`` or without
+    :mod:`multiprocessing` the modules are compiled in this process.
+
+    :param errors: A callable that is called with the filename and a
+        message for modules that fail to compile.
+    :returns: The number of modules with each outcome as a :class:`dict`,
+        including ``'failed'``.
+
+    .. versionadded:: 0.6
+
+    """
+    filenames = list(iter_sources(paths))
+    counts = dict(compiled=0, cached=0, skipped=0, failed=0)
+    if processes != 1 and multiprocessing is not None and len(filenames) > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = list(pool.imap_unordered(_compile_file, filenames,
+                                               chunksize=8))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(_compile_file, filenames)
+    for filename, status, message in sorted(results):
+        counts[status] += 1
+        if message is not None and errors is not None:
+            errors(filename, message)
+    return counts
+
+
+def make_parser(**kwargs):
+    args = dict(
+        prog='attest compile',
+        usage='%prog [options] paths...',
+        description=(
+            'Rewrite the assert statements of test modules ahead of time, '
+            'caching the code for later runs. The positional "paths" are '
+            'modules or directories scanned recursively for them.'
+        ),
+        option_list=[
+            make_option('-j', '--jobs',
+                metavar='N', type='int',
+                help='compile with N processes, default one per CPU'
+            ),
+            make_option('-q', '--quiet',
+                action='store_true',
+                help="don't print a summary"
+            ),
+        ]
+    )
+    args.update(kwargs)
+    return OptionParser(**args)
+
+
+def main(argv=None, **kwargs):
+    parser = make_parser(**kwargs)
+    options, args = parser.parse_args(argv)
+    if not args:
+        args = ['.']
+    def errors(filename, message):
+        print >>sys.stderr, '%s: %s' % (filename, message)
+    counts = compile_paths(args, options.jobs, errors)
+    if not options.quiet:
+        print 'Compiled %(compiled)d, cached %(cached)d, ' \
+              'skipped %(skipped)d, failed %(failed)d' % counts
+    if counts['failed']:
+        raise SystemExit(1)
@@ -3,9 +3,9 @@ from __future__ import absolute_import, with_statement
 
 import inspect
 import os
+import re
 import sys
 import traceback
-import unittest
 import _ast
 
 from os            import path
@@ -17,11 +17,21 @@ except ImportError:
     ABCMeta = type
     abstractmethod = lambda x: x
 
-from attest      import statistics, utils
-from attest.hook import (ExpressionEvaluator,
-                         TestFailure,
-                         COMPILES_AST,
-                         AssertImportHook)
+from attest          import statistics, utils
+from attest.utils    import memoized_property
+from attest.contexts import CapturedLog
+from attest.diff     import diff
+from attest.saferepr import saferepr
+from attest.hook     import (ExpressionEvaluator,
+                             EvaluatedExpression,
+                             TestFailure,
+                             TestFailures,
+                             COMPILES_AST,
+                             AssertImportHook)
+
+
+#: Directory of Attest itself, hidden from tracebacks.
+THISDIR = path.abspath(path.dirname(__file__))
 
 
 # TODO: find some better test
@@ -51,32 +61,108 @@ __all__ = ['TestResult',
 class TestResult(object):
     """Container for result data from running a test.
 
+    The derived properties are computed when first accessed and then
+    remembered, so reporters can use them freely.
+
+    .. attribute:: test
+
+        The test callable.
+
+    .. attribute:: error
+
+        The exception instance, if the test failed.
+
+    .. attribute:: exc_info
+
+        The :func:`~sys.exc_info` of the exception, if the test failed.
+
+    .. attribute:: stdout
+
+        A list of lines the test printed on the standard output.
+
+    .. attribute:: stderr
+
+        A list of lines the test printed on the standard error.
+
+    .. attribute:: logs
+
+        A :class:`~attest.contexts.CapturedLog` of the records the test
+        logged, if it failed, formatted as lines.
+
+        .. versionadded:: 0.6
+
+    .. attribute:: time
+
+        The time it took to run the test, in seconds.
+
+    .. attribute:: subtest
+
+        The name of the :func:`~attest.collectors.subtest` this is the
+        result of, or :const:`None` for the result of a whole test.
+
+        .. versionadded:: 0.6
+
     .. versionadded:: 0.4
 
+    .. versionchanged:: 0.6
+        Uses ``__slots__``, so arbitrary attributes can no longer be set.
+
     """
 
+    __slots__ = ('full_tracebacks', 'debugger', 'test', 'error', 'exc_info',
+                 'stdout', 'stderr', 'logs', 'time', 'subtest', '_memo')
+
     def __init__(self, **kwargs):
+        self.full_tracebacks = False
+        self.debugger = False
+        self.test = self.error = self.exc_info = None
+        self.stdout = self.stderr = self.logs = self.time = None
+        self.subtest = None
+        self._memo = {}
         for key, value in kwargs.iteritems():
             setattr(self, key, value)
 
-    full_tracebacks = False
-
-    debugger = False
-
-    #: The test callable.
-    test = None
+    def snapshot(self):
+        """Render the failure details and release the traceback and
+        evaluation context of the failure, so that failing tests don't keep
+        their frames and everything they reference alive until the run has
+        finished. Afterwards, the traceback in :attr:`exc_info` is
+        :const:`None` and any :class:`~attest.hook.TestFailure` holds an
+        :class:`~attest.hook.EvaluatedExpression`. Details that can't be
+        rendered, because the code under test raises an exception, are
+        replaced with a placeholder naming the exception.
 
-    #: The exception instance, if the test failed.
-    error = None
+        .. versionadded:: 0.6
 
-    #: The :func:`~sys.exc_info` of the exception, if the test failed.
-    exc_info = None
-
-    #: A list of lines the test printed on the standard output.
-    stdout = None
-
-    #: A list of lines the test printed on the standard error.
-    stderr = None
+        """
+        if self.exc_info is None or self.exc_info[2] is None:
+            return
+        # Remember everything that needs the live objects
+        if isinstance(self.logs, CapturedLog):
+            self.logs.release()
+        # Rendering calls into the code under test, which mustn't abort
+        # the run, so errors are rendered in place of the details
+        for name in ('raw_traceback', 'traceback', 'assertion',
+                     'equality_diff'):
+            try:
+                getattr(self, name)
+            except Exception, e:
+                if name == 'raw_traceback':
+                    self._memo[name] = []
+                else:
+                    self._memo[name] = _render_error(e, name)
+        self.exc_info = self.exc_info[:2] + (None,)
+        if getattr(self.error, '__traceback__', None) is not None:
+            self.error.__traceback__ = None
+        for failure in self.failures:
+            if isinstance(failure.value, ExpressionEvaluator):
+                try:
+                    failure.value = failure.value.snapshot()
+                except Exception, e:
+                    failure.value = EvaluatedExpression(
+                        failure.value.expr, _render_error(e, 'expression'))
+        if isinstance(self.error, TestFailures):
+            self.error.value = self.error.failures[0].value
 
     def debug(self):
         if self.debugger:
@@ -84,7 +170,7 @@ class TestResult(object):
             tb = self.exc_info[2]
             pdb.post_mortem(tb)
 
-    @property
+    @memoized_property
     def test_name(self):
         """A representative name for the test, similar to its import path.
 
@@ -95,9 +181,12 @@ class TestResult(object):
         if hasattr(self.test, 'im_class'):
             parts.append(self.test.im_class.__name__)
         parts.append(self.test.__name__)
-        return '.'.join(parts)
+        name = '.'.join(parts)
+        if self.subtest is not None:
+            name = '%s[%s]' % (name, self.subtest)
+        return name
 
-    @property
+    @memoized_property
     def raw_traceback(self):
         """Like :func:`traceback.extract_tb` with uninteresting entries
         removed.
@@ -114,14 +203,16 @@ class TestResult(object):
                 newtb.append((filename, 0, funcname, None))
             tb = newtb
         clean = []
-        thisfile = path.abspath(path.dirname(__file__))
+        dirs = {}
         for item in tb:
-            failfile = path.abspath(path.dirname(item[0]))
-            if failfile != thisfile:
+            dirname = path.dirname(item[0])
+            if dirname not in dirs:
+                dirs[dirname] = path.abspath(dirname) != THISDIR
+            if dirs[dirname]:
                 clean.append(item)
         return clean
 
-    @property
+    @memoized_property
     def traceback(self):
         """The traceback for the exception, if the test failed, cleaned up.
 
@@ -129,41 +220,279 @@ class TestResult(object):
         clean = self.raw_traceback
         lines = ['Traceback (most recent call last):\n']
         lines += traceback.format_list(clean)
-        msg = str(self.error)
+        msg = _message(self.error)
         lines += traceback.format_exception_only(self.exc_info[0], msg)
         return ''.join(lines)[:-1]
 
     @property
-    def assertion(self):
+    def failures(self):
+        """The :class:`~attest.hook.TestFailure` exceptions of the test: all
+        those collected by :func:`~attest.contexts.soft_assertions`, the
+        one failure, or for other outcomes those collected before the error.
+
+        .. versionadded:: 0.6
+
+        """
+        if isinstance(self.error, TestFailures):
+            return self.error.failures
         if isinstance(self.error, TestFailure):
-            expressions = str(self.error.value)
-            return '\n'.join('assert %s' % expr
-                             for expr in expressions.splitlines())
+            return [self.error]
+        return getattr(self.error, 'soft_failures', [])
 
-    @property
+    @memoized_property
+    def assertion(self):
+        parts = []
+        for failure in self.failures:
+            expressions = str(failure.value)
+            parts.extend(_location(failure))
+            parts.extend('assert %s' % expr
+                         for expr in expressions.splitlines())
+        if parts:
+            return '\n'.join(parts)
+
+    @memoized_property
     def equality_diff(self):
-        if not isinstance(self.error, TestFailure):
-            return
-        # Create a dummy test case to use its assert* methods
-        case = unittest.FunctionTestCase(lambda: None)
-        case.maxDiff = 2000
-        # Type-specific methods are only available since Python 2.7
-        if hasattr(case, '_type_equality_funcs'):
-            node = self.error.value.node
+        """The differences between the two sides of failed assertions like
+        ``left == right``, from :func:`attest.diff.diff`.
+
+        .. versionchanged:: 0.6 Found by :mod:`attest.diff` rather than the
+            :mod:`unittest` assertion methods.
+
+        """
+        parts = []
+        for failure in self.failures:
+            node = failure.value.node
             if (isinstance(node, _ast.Compare) and len(node.ops) == 1 and
                     isinstance(node.ops[0], _ast.Eq)):
                 # The assertion is something like 'left == right'
-                left = self.error.value.eval(node.left)
-                right = self.error.value.eval(node.comparators[0])
-                if type(left) is type(right):
-                    asserter = case._type_equality_funcs.get(type(left))
-                    if asserter is not None:
-                        if isinstance(asserter, basestring):
-                            asserter = getattr(case, asserter)
-                        try:
-                            asserter(left, right)
-                        except AssertionError, exc:
-                            return '%s\n' % exc.args[0]
+                left = failure.value.eval(node.left)
+                right = failure.value.eval(node.comparators[0])
+                text = diff(left, right)
+                if text is not None:
+                    parts.extend(_location(failure))
+                    parts.append(text)
+        if parts:
+            return '\n'.join(parts)
+
+    @property
+    def outcome(self):
+        """One of ``'success'``, ``'failure'`` for failed assertions and
+        ``'error'`` for other exceptions.
+
+        .. versionadded:: 0.6
+
+        """
+        if self.error is None:
+            return 'success'
+        if isinstance(self.error, AssertionError):
+            return 'failure'
+        return 'error'
+
+    def to_dict(self):
+        """Serialize the result as a :class:`dict` of strings, numbers,
+        lists and :const:`None`, suitable for JSON, that can be turned back
+        into a :class:`TestResult` with :meth:`from_dict` in another process
+        or on another machine. The keys are:
+
+        ``'name'``
+            The :attr:`test_name`.
+        ``'test'``
+            The name of the test callable.
+        ``'doc'``
+            The docstring of the test callable.
+        ``'outcome'``
+            The :attr:`outcome`.
+        ``'time'``
+            The time it took to run the test, in seconds.
+        ``'subtest'``
+            The name of the :attr:`subtest`.
+        ``'stdout'``, ``'stderr'``, ``'logs'``
+            Lists of captured lines.
+        ``'type'``
+            The name of the exception type.
+        ``'message'``
+            The exception message.
+        ``'traceback'``
+            The formatted :attr:`traceback`.
+        ``'raw_traceback'``
+            The :attr:`raw_traceback` as a list of lists.
+        ``'expression'``
+            For failed assert statements, the asserted expression as a list
+            of the source and its rendering with values.
+        ``'assertion'``, ``'equality_diff'``
+            The :attr:`assertion` and :attr:`equality_diff`.
+
+        Values that don't apply are :const:`None`. This is a superset of
+        the records read and written by :mod:`attest.merge`.
+
+        .. versionadded:: 0.6
+
+        """
+        data = dict(name=self.test_name,
+                    test=getattr(self.test, '__name__', None),
+                    doc=getattr(self.test, '__doc__', None),
+                    outcome=self.outcome,
+                    time=self.time,
+                    subtest=self.subtest,
+                    stdout=list(self.stdout or ()),
+                    stderr=list(self.stderr or ()),
+                    logs=list(self.logs or ()),
+                    type=None, message=None, traceback=None,
+                    raw_traceback=None, expression=None,
+                    assertion=None, equality_diff=None)
+        if self.error is not None:
+            data.update(type=self.exc_info[0].__name__,
+                        message=_message(self.error),
+                        traceback=self.traceback,
+                        raw_traceback=map(list, self.raw_traceback),
+                        assertion=self.assertion,
+                        equality_diff=self.equality_diff)
+            if isinstance(self.error, TestFailure):
+                value = self.error.value
+                data['expression'] = [value.expr, repr(value)]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a :class:`TestResult` from the output of :meth:`to_dict`,
+        or from a record read with :mod:`attest.merge`, in which case
+        missing keys are treated as :const:`None`. The :attr:`test` is a
+        stand-in that can't be called, and the traceback in :attr:`exc_info`
+        is :const:`None`.
+
+        Exceptions are recreated as the built-in exception type of the same
+        name if there is one, or otherwise a stand-in subclass of
+        :exc:`AssertionError` or :exc:`Exception` depending on the
+        outcome.
+
+        .. versionadded:: 0.6
+
+        """
+        result = cls()
+        result.__setstate__(data)
+        return result
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, data):
+        self.__init__(time=data.get('time'),
+                      subtest=data.get('subtest'),
+                      stdout=list(data.get('stdout') or ()),
+                      stderr=list(data.get('stderr') or ()),
+                      logs=list(data.get('logs') or ()))
+        self.test = _TestStandIn(data.get('name'), data.get('test'),
+                                 data.get('doc'))
+        self._memo['test_name'] = data.get('name')
+        if data.get('type') is None:
+            return
+        exc_type = _exception_type(data['type'], data.get('outcome'))
+        message = data.get('message') or ''
+        if exc_type is TestFailure:
+            expr, rendered = data.get('expression') or ('', '')
+            error = TestFailure(EvaluatedExpression(expr, rendered), message)
+        else:
+            error = exc_type.__new__(exc_type)
+            error.args = (message,)
+        self.error = error
+        self.exc_info = (exc_type, error, None)
+        raw_traceback = data.get('raw_traceback')
+        if raw_traceback is None:
+            raw_traceback = _parse_traceback(data.get('traceback') or '')
+        self._memo.update(raw_traceback=map(tuple, raw_traceback),
+                          traceback=data.get('traceback'),
+                          assertion=data.get('assertion'),
+                          equality_diff=data.get('equality_diff'))
+
+
+def _message(error):
+    """The message of the exception `error`, also for unicode messages on
+    Python 2 where :func:`str` can't encode them.
+
+    """
+    try:
+        return str(error)
+    except Exception:
+        pass
+    try:
+        return unicode(error)
+    except Exception:
+        return saferepr(error)
+
+
+def _source_file(test):
+    """The source file of the `test` callable, or of its module for
+    stand-ins, or :const:`None`.
+
+    """
+    for obj in (test, sys.modules.get(getattr(test, '__module__', None))):
+        try:
+            return inspect.getsourcefile(obj)
+        except TypeError:
+            pass
+
+
+def _render_error(error, name):
+    """A placeholder for failure details that couldn't be rendered."""
+    return '<[%s raised rendering the %s]>' % (type(error).__name__,
+                                               name.replace('_', ' '))
+
+
+def _location(failure):
+    """The location of a soft assertion `failure` as a comment line."""
+    location = getattr(failure, 'location', None)
+    if location is None:
+        return []
+    return ['# %s:%d' % location]
+
+
+class _TestStandIn(object):
+    """Stands in for the test callable of a deserialized result."""
+
+    def __init__(self, name, shortname=None, doc=None):
+        name = name or ''
+        self.__module__, _, self.__name__ = name.rpartition('.')
+        if shortname is not None:
+            self.__name__ = shortname
+        self.__doc__ = doc
+
+    def __call__(self):
+        raise RuntimeError('%s was run elsewhere' % self.__name__)
+
+
+_exception_types = {}
+
+
+def _exception_type(name, outcome):
+    if name in (TestFailure.__name__, TestFailures.__name__):
+        return TestFailure
+    import __builtin__
+    builtin = getattr(__builtin__, name, None)
+    if isinstance(builtin, type) and issubclass(builtin, BaseException):
+        return builtin
+    base = AssertionError if outcome == 'failure' else Exception
+    if (name, base) not in _exception_types:
+        _exception_types[name, base] = type(str(name), (base,), {})
+    return _exception_types[name, base]
+
+
+_traceback_entry = re.compile(r'^  File "(.*)", line (\d+), in (.*)$')
+
+
+def _parse_traceback(text):
+    """Recover the entries of a traceback formatted by
+    :func:`traceback.format_list`.
+
+    """
+    entries = []
+    for line in text.splitlines():
+        match = _traceback_entry.match(line)
+        if match is not None:
+            filename, lineno, funcname = match.groups()
+            entries.append([filename, int(lineno), funcname, None])
+        elif entries and line.startswith('    ') and entries[-1][3] is None:
+            entries[-1][3] = line.strip()
+    return entries
 
 
 def _test_loader_factory(reporter):
@@ -260,10 +589,14 @@ class PlainReporter(AbstractReporter):
         self.failures = []
 
     def success(self, result):
+        if result.subtest is not None:
+            self.total += 1
         sys.stdout.write('.')
         sys.stdout.flush()
 
     def failure(self, result):
+        if result.subtest is not None:
+            self.total += 1
         if isinstance(result.error, AssertionError):
             sys.stdout.write('F')
         else:
@@ -285,6 +618,8 @@ class PlainReporter(AbstractReporter):
                 print '->', '\n'.join(result.stdout)
             if result.stderr:
                 print 'E:', '\n'.join(result.stderr)
+            if result.logs:
+                print 'L:', '\n'.join(result.logs)
             print result.traceback
             print
             result.debug()
@@ -339,6 +674,7 @@ class FancyReporter(AbstractReporter):
         from progressbar import ProgressBar, Percentage, ETA, SimpleProgress
         widgets = ['[', Percentage(), '] ', SimpleProgress(), ' ', ETA()]
         self.counter = 0
+        self.completed = 0
         self.progress = ProgressBar(maxval=len(tests), widgets=widgets)
         if tests:
             self.progress.start()
@@ -346,17 +682,21 @@ class FancyReporter(AbstractReporter):
         self.failures = []
 
     def success(self, result):
-        self.counter += 1
-        self.total_time += result.time
-        self.progress.update(self.counter)
+        self.advance(result)
         self.passes.append(result)
 
     def failure(self, result):
-        self.counter += 1
-        self.total_time += result.time
-        self.progress.update(self.counter)
+        self.advance(result)
         self.failures.append(result)
 
+    def advance(self, result):
+        self.counter += 1
+        # Subtests are part of the test, which is reported after them
+        if result.subtest is None:
+            self.completed += 1
+            self.total_time += result.time
+            self.progress.update(self.completed)
+
     def finished(self):
         from pygments.lexers import (PythonTracebackLexer, PythonLexer,
                                      DiffLexer)
@@ -400,6 +740,9 @@ class FancyReporter(AbstractReporter):
             for line in result.stderr:
                 print colorize('red', '→'),
                 print line
+            for line in result.logs or ():
+                print colorize('yellow', '→'),
+                print line
 
         if self.verbose:
             for result in self.passes:
@@ -505,6 +848,10 @@ class XmlReporter(AbstractReporter):
 
 class XUnitReporter(AbstractReporter):
     """Report the result of a testrun in an XUnit XML format.
+
+    .. versionchanged:: 0.6
+        The captured output of failing tests is included.
+
     """
 
     def __init__(self, file=None):
@@ -527,15 +874,15 @@ class XUnitReporter(AbstractReporter):
 
     def success(self, result):
         self.successes += 1
-        self.total_time += result.time
+        self.add_time(result)
         self.reports.append(
             '<testcase classname="%s" name="%s" time="%f" />' % (
-                result.test_name, result.test.__name__, result.time))
+                self.names(result) + (result.time,)))
         if self.file:
             print result.test_name, "... ok"
 
     def failure(self, result):
-        self.total_time += result.time
+        self.add_time(result)
         if isinstance(result.error, AssertionError):
             tag = 'failure'
             self.failures += 1
@@ -544,7 +891,7 @@ class XUnitReporter(AbstractReporter):
             self.errors += 1
 
         error = '<testcase classname="%s" name="%s" time="%f">\n' % (
-            result.test_name, result.test.__name__, result.time)
+            self.names(result) + (result.time,))
 
         error += '<%s type="%s" message="%s"><![CDATA[\n' % (
             tag,
@@ -555,11 +902,30 @@ class XUnitReporter(AbstractReporter):
                     for line in
                     result.traceback.splitlines()),
             quote=True)
-        error += '\n]]>\n</%s>\n</testcase>' % tag
+        error += '\n]]>\n</%s>\n' % tag
+        for name, lines in (('system-out', result.stdout),
+                            ('system-err', result.stderr)):
+            if lines:
+                error += '<%s><![CDATA[\n%s\n]]></%s>\n' % (
+                    name, self.escape('\n'.join(lines), quote=True), name)
+        error += '</testcase>'
         self.reports.append(error)
         if self.file:
             print result.test_name, "... ", tag
 
+    def add_time(self, result):
+        # The time of subtests is included in that of their test
+        if result.subtest is None:
+            self.total_time += result.time
+
+    def names(self, result):
+        """The escaped class name and name of the test case of `result`."""
+        name = result.test.__name__
+        if result.subtest is not None:
+            name = '%s[%s]' % (name, result.subtest)
+        return (self.escape(result.test_name, quote=True),
+                self.escape(name, quote=True))
+
     def finished(self):
         out = '<?xml version="1.0" encoding="UTF-8"?>\n'
         out += ('<testsuite name="attest" tests="%d" ' +
@@ -615,8 +981,14 @@ class QuickFixReporter(AbstractReporter):
 
     def failure(self, result):
         self.failed = True
-        fn, lineno = result.raw_traceback[-1][:2]
-        type, msg = result.exc_info[0].__name__, str(result.exc_info[1])
+        if result.raw_traceback:
+            fn, lineno = result.raw_traceback[-1][:2]
+        else:
+            # The traceback couldn't be rendered or wasn't serialized
+            fn, lineno = _source_file(result.test) or '?', 0
+        type, msg = result.exc_info[0].__name__, _message(result.exc_info[1])
+        if not isinstance(msg, str):
+            msg = msg.encode('utf-8')
         if msg:
             msg = ': ' + msg
         print "%s:%s: %s%s" % (fn, lineno, type, msg)
@@ -647,6 +1019,7 @@ def get_reporter_by_name(name, default='auto'):
     * ``'plain'`` — :class:`PlainReporter`
     * ``'xunit'`` – :class:`XUnitReporter`
     * ``'quickfix'`` — :class:`QuickFixReporter`
+    * ``'resultlog'`` — :class:`~attest.resultlog.ResultLogReporter`
     * ``'xml'`` — :class:`XmlReporter`
     * ``'auto'`` — :func:`auto_reporter`
 
@@ -680,7 +1053,7 @@ def get_all_reporters():
         from attest import get_all_reporters
 
     >>> list(get_all_reporters())
-    ['xml', 'plain', 'xunit', 'fancy', 'auto', 'quickfix']
+    ['xml', 'plain', 'xunit', 'fancy', 'auto', 'quickfix', 'resultlog']
 
     .. versionadded:: 0.4
 
@@ -0,0 +1,284 @@
+"""A compact, append-only binary format for test results.
+
+A log starts with :data:`MAGIC` followed by any number of records, each a
+one byte kind and a four byte little-endian payload length followed by the
+payload. Every run written to the log starts with a session record, after
+which string records define a string table (numbered from zero in order)
+that result records refer to, so that test names and exception types are
+stored only once per session.
+
+"""
+from __future__ import with_statement
+
+import os
+import struct
+import time
+
+from attest.reporters import AbstractReporter
+
+
+__all__ = ['ResultLogReporter',
+           'ResultLog',
+          ]
+
+
+# Plain string literals are bytes on Python 2 but text after 2to3
+def _bytes(s):
+    return s.encode('latin-1')
+
+
+#: Identifies result log files, including the format version.
+MAGIC = _bytes('ATTESTLOG\x00\x01\n')
+
+#: Record kinds.
+SESSION_KIND, STRING_KIND, RESULT_KIND = _bytes('B'), _bytes('S'), _bytes('R')
+
+FRAME = struct.Struct('<cI')
+SESSION = struct.Struct('<d')
+RESULT = struct.Struct('<BdIIIIII')
+
+#: String id used for missing values.
+NONE = 0xFFFFFFFF
+
+OUTCOMES = ('success', 'failure', 'error')
+
+#: Strings shorter than this are interned by writers and kept in memory by
+#: readers; longer strings, such as tracebacks, are written every time and
+#: read from the file on demand.
+INTERN_LIMIT = 256
+
+
+class ResultLogWriter(object):
+    """Append result records to the log in `file`, an open binary file."""
+
+    def __init__(self, file, hostname=None, timestamp=None):
+        self.file = file
+        self.strings = {}
+        self.count = 0
+        self.file.seek(0, os.SEEK_END)
+        if not self.file.tell():
+            self.file.write(MAGIC)
+        if timestamp is None:
+            timestamp = time.time()
+        payload = SESSION.pack(timestamp) + _encode(hostname or '')
+        self._frame(SESSION_KIND, payload)
+
+    def _frame(self, kind, payload):
+        self.file.write(FRAME.pack(kind, len(payload)))
+        self.file.write(payload)
+
+    def _string(self, s):
+        if s is None:
+            return NONE
+        s = _encode(s)
+        if s in self.strings:
+            return self.strings[s]
+        self._frame(STRING_KIND, s)
+        id, self.count = self.count, self.count + 1
+        if len(s) < INTERN_LIMIT:
+            self.strings[s] = id
+        return id
+
+    def write(self, record):
+        ids = [self._string(record[key])
+               for key in ('name', 'type', 'message', 'traceback')]
+        for key in ('stdout', 'stderr'):
+            lines = record.get(key)
+            ids.append(self._string('\n'.join(lines) if lines else None))
+        outcome = OUTCOMES.index(record['outcome'])
+        self._frame(RESULT_KIND, RESULT.pack(outcome, record['time'], *ids))
+
+    def close(self):
+        self.file.flush()
+
+
+def _encode(s):
+    if isinstance(s, unicode):
+        return s.encode('utf-8')
+    return s
+
+
+def _decode(s):
+    return s.decode('utf-8', 'replace')
+
+
+class ResultLog(object):
+    """Reader for result logs written by :class:`ResultLogReporter`.
+    Iterating yields result records as described by
+    :func:`~attest.merge.read_xunit`.
+
+    :param file: A filename or a file object opened in binary mode.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, file):
+        self.file = file
+        #: Hostname of the first session in the log.
+        self.hostname = None
+        #: Start time of the first session in the log, in ISO 8601 format.
+        self.timestamp = None
+
+    def _scan(self):
+        """Iterate over the raw result tuples in the log, paired with a
+        function for looking up string ids in the current session.
+
+        """
+        if isinstance(self.file, basestring):
+            file = open(self.file, 'rb')
+        else:
+            file = self.file
+            file.seek(0)
+        try:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError('not a result log')
+            table = []
+            def string(id):
+                if id == NONE:
+                    return None
+                value = table[id]
+                if type(value) is tuple:
+                    offset, length = value
+                    position = file.tell()
+                    file.seek(offset)
+                    value = file.read(length)
+                    file.seek(position)
+                return _decode(value)
+            while True:
+                frame = file.read(FRAME.size)
+                if len(frame) < FRAME.size:
+                    break
+                kind, length = FRAME.unpack(frame)
+                if kind == STRING_KIND:
+                    if length < INTERN_LIMIT:
+                        table.append(file.read(length))
+                    else:
+                        table.append((file.tell(), length))
+                        file.seek(length, os.SEEK_CUR)
+                elif kind == RESULT_KIND:
+                    yield RESULT.unpack(file.read(length)), string
+                elif kind == SESSION_KIND:
+                    del table[:]
+                    payload = file.read(length)
+                    if self.timestamp is None:
+                        self._session(payload)
+                else:
+                    file.seek(length, os.SEEK_CUR)
+        finally:
+            if file is not self.file:
+                file.close()
+
+    def _session(self, payload):
+        from datetime import datetime
+        timestamp, = SESSION.unpack(payload[:SESSION.size])
+        self.timestamp = datetime.fromtimestamp(timestamp).isoformat()
+        self.hostname = _decode(payload[SESSION.size:]) or None
+
+    def __iter__(self):
+        for raw, string in self._scan():
+            yield _make_record(raw, string)
+
+    def filter(self, outcome=None, name=None):
+        """Iterate over the records with the given `outcome` and with names
+        starting with `name`, if provided. Strings other than the name are
+        only decoded for matching records.
+
+        """
+        for raw, string in self._scan():
+            if outcome is not None and OUTCOMES[raw[0]] != outcome:
+                continue
+            if name is not None and not string(raw[2]).startswith(name):
+                continue
+            yield _make_record(raw, string)
+
+    def totals(self):
+        """Aggregate the log without decoding any strings.
+
+        :returns: A :class:`dict` with the count of each outcome and the
+            total ``'time'``.
+
+        """
+        totals = dict.fromkeys(OUTCOMES, 0)
+        total_time = 0
+        for raw, _ in self._scan():
+            totals[OUTCOMES[raw[0]]] += 1
+            total_time += raw[1]
+        totals['time'] = total_time
+        return totals
+
+    def to_xunit(self, file, name='attest'):
+        """Write the log as an XUnit XML report to `file`."""
+        from attest.merge import XUnitWriter
+        self._convert(XUnitWriter, file, name)
+
+    def to_jsonl(self, file):
+        """Write the log as JSON lines to `file`."""
+        from attest.merge import JsonLinesWriter
+        self._convert(JsonLinesWriter, file)
+
+    def _convert(self, writer, file, name='attest'):
+        records = iter(self)
+        # Start reading to pick up the session metadata
+        try:
+            first = records.next()
+        except StopIteration:
+            first = None
+        writer = writer(file, name=name, hostname=self.hostname,
+                        timestamp=self.timestamp)
+        if first is not None:
+            writer.write(first)
+            for record in records:
+                writer.write(record)
+        writer.close()
+
+
+def _make_record(raw, string):
+    outcome, time, name, type, message, traceback, stdout, stderr = raw
+    stdout, stderr = string(stdout), string(stderr)
+    return dict(name=string(name), outcome=OUTCOMES[outcome], time=time,
+                type=string(type), message=string(message),
+                traceback=string(traceback),
+                stdout=stdout.split('\n') if stdout is not None else [],
+                stderr=stderr.split('\n') if stderr is not None else [])
+
+
+def read_resultlog(file):
+    """Iterate over the result records in the result log `file`."""
+    return iter(ResultLog(file))
+
+
+class ResultLogReporter(AbstractReporter):
+    """Append results to a compact binary log, which can be read with
+    :class:`ResultLog` and converted to other formats or combined with
+    :command:`attest merge`. Captured output is only kept for failures.
+
+    :param file: Filename of the log, created if it doesn't exist.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, file='results.log'):
+        self.file = file
+        self.failed = False
+
+    def begin(self, tests):
+        self.writer = ResultLogWriter(open(self.file, 'ab'))
+
+    def success(self, result):
+        # The output of passing tests isn't kept, and would otherwise be
+        # read back in if it was spilled to disk
+        self.writer.write(dict(name=result.test_name, outcome='success',
+                               time=result.time, type=None, message=None,
+                               traceback=None, stdout=None, stderr=None))
+
+    def failure(self, result):
+        self.failed = True
+        self.writer.write(result.to_dict())
+
+    def finished(self):
+        self.writer.close()
+        self.writer.file.close()
+        if self.failed:
+            raise SystemExit(1)
@@ -8,14 +8,24 @@ from pkg_resources import get_distribution
 from optparse import OptionParser, make_option
 from attest.collectors import Tests
 from attest.reporters import get_all_reporters, get_reporter_by_name
-from attest.utils import parse_options
+from attest.utils import parse_options, import_dotted_name
 from attest.hook import AssertImportHook
 
 
+#: Subcommands of the :command:`attest` program, mapping the name given as
+#: the first argument to the dotted name of a function that is called with
+#: the remaining arguments.
+COMMANDS = {'merge': 'attest.merge:main',
+            'compile': 'attest.precompile:main',
+           }
+
+
 def make_parser(**kwargs):
     args = dict(
         prog='attest',
-        usage='%prog [options] [tests...] [key=value...]',
+        usage=('%prog [options] [tests...] [key=value...]\n'
+               '       %prog merge [options] files...\n'
+               '       %prog compile [options] paths...'),
         version=get_distribution('Attest').version,
 
         description=(
@@ -47,6 +57,23 @@ def make_parser(**kwargs):
                 action='store_true',
                 help="don't capture stderr and stdout"
             ),
+            make_option('--fd-capture',
+                action='store_true',
+                help='capture output at the file descriptor level'
+            ),
+            make_option('--capture-limit',
+                metavar='BYTES', type='int',
+                help='keep the first and last half of BYTES of output'
+            ),
+            make_option('--capture-lines',
+                metavar='LINES', type='int',
+                help='keep the first and last half of LINES of output'
+            ),
+            make_option('--log-level',
+                metavar='LEVEL',
+                choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                help='capture log records of LEVEL and above'
+            ),
             make_option('--full-tracebacks',
                 action='store_true',
                 help="don't clean tracebacks"
@@ -59,6 +86,11 @@ def make_parser(**kwargs):
                 action='store_true',
                 help="don't hook the assert statement"
             ),
+            make_option('--rewrite',
+                metavar='PACKAGES', action='append', default=[],
+                help='also hook the assert statement in PACKAGES, '
+                     'separated by commas'
+            ),
             make_option('-p', '--profile',
                 metavar='FILENAME',
                 help='enable tests profiling and store results in filename'
@@ -74,6 +106,12 @@ def make_parser(**kwargs):
 
 
 def main(tests=None, **kwargs):
+    if tests is None and sys.argv[1:2] and sys.argv[1] in COMMANDS:
+        name = sys.argv[1]
+        command = import_dotted_name(COMMANDS[name])
+        prog = '%s %s' % (kwargs.get('prog', 'attest'), name)
+        return command(sys.argv[2:], prog=prog)
+
     parser = make_parser(**kwargs)
     options, args = parser.parse_args()
 
@@ -102,7 +140,14 @@ def main(tests=None, **kwargs):
         if options.native_assert:
             tests = Tests(names)
         else:
-            with AssertImportHook():
+            # Only the packages the tests are in need to be rewritten,
+            # unless others are named
+            roots = set(name.replace(':', '.').split('.', 1)[0]
+                        for name in names)
+            for value in options.rewrite:
+                roots.update(name.strip() for name in value.split(',')
+                             if name.strip())
+            with AssertImportHook(prefixes=roots):
                 tests = Tests(names)
 
     def run():
@@ -110,6 +155,10 @@ def main(tests=None, **kwargs):
                             fail_fast=options.fail_fast,
                             debugger=options.debugger,
                             no_capture=options.no_capture,
+                            fd_capture=options.fd_capture,
+                            capture_limit=options.capture_limit,
+                            capture_lines=options.capture_lines,
+                            log_level=options.log_level,
                             keyboard_interrupt=options.keyboard_interrupt)
 
     if options.profile:
@@ -0,0 +1,148 @@
+import sys
+
+from itertools import islice
+from repr      import Repr
+from time      import time
+
+
+__all__ = ['SafeRepr',
+           'saferepr',
+          ]
+
+
+if sys.version_info >= (3,):
+    SET = 'set()', '{', '}'
+    FROZENSET = 'frozenset()', 'frozenset({', '})'
+else:
+    SET = 'set([])', 'set([', '])'
+    FROZENSET = 'frozenset([])', 'frozenset([', '])'
+
+
+def _elide(s, size):
+    """Shorten `s` to `size` characters by replacing the middle with
+    ``...``.
+
+    """
+    if len(s) <= size:
+        return s
+    i = max(0, (size - 3) // 2)
+    j = max(0, size - 3 - i)
+    return s[:i] + '...' + s[len(s) - j:]
+
+
+class SafeRepr(Repr):
+    """A :class:`repr.Repr` for rendering values in assertion failures,
+    where the values can be arbitrarily large and their :meth:`__repr__`
+    methods can be broken.
+
+    Containers are rendered at most :attr:`maxlevel` levels deep and with a
+    limited number of items per type, see :class:`repr.Repr`, with the
+    number of items left out noted in their place. Strings and the
+    representations of other objects are shortened in the middle, as is
+    the whole result to at most `maxsize` characters. Once rendering has
+    taken `timeout` seconds, the remaining items of containers are left out.
+    Exceptions raised by :func:`repr` are shown in place of the value.
+    NumPy arrays are summarized by NumPy, like arrays with more elements
+    than its print threshold.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, maxsize=4000, timeout=1.0):
+        Repr.__init__(self)
+        self.maxlevel = 6
+        self.maxtuple = self.maxlist = self.maxarray = 100
+        self.maxset = self.maxfrozenset = self.maxdeque = 100
+        self.maxdict = 50
+        self.maxstring = self.maxlong = self.maxother = 1000
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.deadline = None
+
+    def repr(self, x):
+        if self.timeout is not None:
+            self.deadline = time() + self.timeout
+        try:
+            return _elide(self.repr1(x, self.maxlevel), self.maxsize)
+        finally:
+            self.deadline = None
+
+    @property
+    def expired(self):
+        """:const:`True` once the time for the current rendering is up."""
+        return self.deadline is not None and time() > self.deadline
+
+    def repr1(self, x, level):
+        try:
+            return Repr.repr1(self, x, level)
+        except Exception, e:
+            return '<[%s raised in repr()] %s object at 0x%x>' % (
+                type(e).__name__, type(x).__name__, id(x))
+
+    def _items(self, x, level, maxiter, render):
+        """Render up to `maxiter` items of `x`, noting those left out."""
+        pieces = []
+        for item in islice(x, maxiter):
+            if self.expired:
+                break
+            pieces.append(render(item, level - 1))
+        if len(x) > len(pieces):
+            pieces.append('<%d more>' % (len(x) - len(pieces)))
+        return ', '.join(pieces)
+
+    def _repr_iterable(self, x, level, left, right, maxiter, trail=''):
+        if not len(x):
+            return left + right
+        if level <= 0:
+            return '%s...%s' % (left, right)
+        if len(x) == 1 and trail:
+            right = trail + right
+        return left + self._items(x, level, maxiter, self.repr1) + right
+
+    # Unlike repr.Repr, sets and dicts aren't sorted, in the same order as
+    # the built-in repr() and without sorting every item for the few shown.
+
+    def repr_set(self, x, level):
+        empty, left, right = SET
+        if not x:
+            return empty
+        return self._repr_iterable(x, level, left, right, self.maxset)
+
+    def repr_frozenset(self, x, level):
+        empty, left, right = FROZENSET
+        if not x:
+            return empty
+        return self._repr_iterable(x, level, left, right, self.maxfrozenset)
+
+    def repr_dict(self, x, level):
+        if not x:
+            return '{}'
+        if level <= 0:
+            return '{...}'
+        def render(key, level):
+            return '%s: %s' % (self.repr1(key, level),
+                               self.repr1(x[key], level))
+        return '{%s}' % self._items(x, level, self.maxdict, render)
+
+    def repr_unicode(self, x, level):
+        return self.repr_str(x, level)
+
+    def repr_ndarray(self, x, level):
+        # NumPy summarizes arrays with more elements than the threshold
+        numpy = sys.modules['numpy']
+        options = numpy.get_printoptions()
+        numpy.set_printoptions(threshold=self.maxarray, edgeitems=3)
+        try:
+            return _elide(repr(x), self.maxother)
+        finally:
+            numpy.set_printoptions(**options)
+
+
+def saferepr(obj, maxsize=4000, timeout=1.0):
+    """Render `obj` with a new :class:`SafeRepr`.
+
+    .. versionadded:: 0.6
+
+    """
+    return SafeRepr(maxsize, timeout).repr(obj)
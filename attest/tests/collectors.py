@@ -238,3 +238,166 @@ def testcase_naming():
     assert TestCase.test_something
     assert TestCase.test_lambda
 
+
+
+@suite.test
+def failure_snapshots():
+    import pickle
+    from attest import EvaluatedExpression
+
+    col = Tests()
+
+    @col.test
+    def fail():
+        value = 1 + 1
+        assert value == 3
+
+    result = TestReporter()
+    col.run(result)
+    failure = result.failed[0]
+    assert failure.exc_info[2] is None
+    assert isinstance(failure.error.value, EvaluatedExpression)
+    assert failure.assertion == 'assert (value == 3)\nassert (2 == 3)'
+    assert failure.traceback.startswith('Traceback')
+
+    error = pickle.loads(pickle.dumps(failure.error))
+    assert type(error) is TestFailure
+    assert str(error.value) == str(failure.error.value)
+
+    result = TestReporter()
+    col.run(result, debugger=True)
+    assert result.failed[0].exc_info[2] is not None
+
+
+@suite.test
+def logs_of_failures():
+    import logging
+
+    col = Tests()
+
+    @col.test
+    def passing():
+        logging.getLogger('app').warning('passing')
+
+    @col.test
+    def failing():
+        logging.getLogger('app').debug('failing %s', 'slowly')
+        assert False
+
+    result = TestReporter()
+    col.run(result, log_level=logging.DEBUG)
+    assert result.succeeded[0].logs is None
+    failure = result.failed[0]
+    assert failure.logs == ['DEBUG app: failing slowly']
+    assert not failure.logs.records
+    assert failure.to_dict()['logs'] == ['DEBUG app: failing slowly']
+
+
+@suite.test
+def subtests():
+    from attest import subtest
+
+    col = Tests()
+
+    @col.test
+    def cases():
+        print 'setup'
+        for value in (1, 2, 3):
+            with subtest(str(value)):
+                print 'case', value
+                assert value != 2
+        print 'done'
+
+    result = TestReporter()
+    col.run(result)
+    names = [r.test_name for r in result.succeeded]
+    assert names == ['attest.tests.collectors.cases[1]',
+                     'attest.tests.collectors.cases[3]',
+                     'attest.tests.collectors.cases']
+    assert [r.subtest for r in result.succeeded] == ['1', '3', None]
+    assert result.succeeded[1].stdout == ['case 3']
+    assert result.succeeded[2].stdout == ['setup', 'done']
+
+    failure, = result.failed
+    assert failure.subtest == '2'
+    assert failure.stdout == ['case 2']
+    assert isinstance(failure.error, TestFailure)
+    assert failure.to_dict()['subtest'] == '2'
+
+    @col.test
+    def skipped():
+        pass
+
+    result = TestReporter()
+    col.run(result, fail_fast=True)
+    assert len(result.succeeded) == 3
+    assert len(result.failed) == 1
+
+    with subtest('outside'):
+        ran = True
+    assert ran
+
+    # Subtests that finished are reported when the run is interrupted, and
+    # subtests in threads started by a test simply run
+    import threading
+    col = Tests()
+    threads = []
+
+    @col.test
+    def interrupted():
+        with subtest('before'):
+            pass
+        def child():
+            with subtest('thread'):
+                threads.append(True)
+        thread = threading.Thread(target=child)
+        thread.start()
+        thread.join()
+        raise KeyboardInterrupt
+
+    @col.test
+    def never():
+        pass
+
+    result = TestReporter()
+    col.run(result)
+    assert threads == [True]
+    assert [r.subtest for r in result.succeeded] == ['before']
+    assert not result.failed
+
+
+@suite.test
+def unrenderable_failures():
+
+    class Unprintable(Exception):
+        def __str__(self):
+            raise ValueError('unprintable')
+
+    class Flaky(object):
+        # Compares unequal once, then breaks
+        calls = 0
+        def __eq__(self, other):
+            Flaky.calls += 1
+            if Flaky.calls > 1:
+                raise ValueError('flaky')
+            return False
+        def __ne__(self, other):
+            return not self == other
+
+    col = Tests()
+
+    @col.test
+    def unprintable():
+        raise Unprintable()
+
+    @col.test
+    def flaky():
+        assert [Flaky()] == [Flaky()]
+
+    result = TestReporter()
+    col.run(result)
+    unprintable, flaky = result.failed
+    assert unprintable.traceback.endswith('Unprintable: Unprintable()')
+    assert flaky.assertion.startswith('assert ([Flaky()] == [Flaky()])')
+    assert flaky.equality_diff == \
+            '<[ValueError raised rendering the equality diff]>'
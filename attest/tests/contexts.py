@@ -24,10 +24,24 @@ def capture():
 
     assert out == ['Capture the flag!']
     assert err == ['Rapture the flag?']
+    assert type(out) is list and type(err) is list
+    assert out + err == ['Capture the flag!', 'Rapture the flag?']
 
     assert sys.stdout is stdout
     assert sys.stderr is stderr
 
+    # Errors setting up the capture aren't hidden
+    from attest import contexts
+    def broken(buffers):
+        raise RuntimeError('broken')
+    push_capture, contexts._push_capture = contexts._push_capture, broken
+    try:
+        with attest.raises(RuntimeError):
+            with attest.capture_output():
+                pass
+    finally:
+        contexts._push_capture = push_capture
+
 
 @suite.test
 def disable_imports():
@@ -116,3 +130,271 @@ def warns():
                 warnings.warn("foo")
             with attest.raises(UserWarning):
                 warnings.warn("bar")
+
+
+@suite.test
+def capture_fd():
+    """capture_fd_output()"""
+
+    with attest.capture_fd_output() as (out, err):
+        os.write(1, 'Capture the fd!\n')
+        os.write(2, 'Rapture the fd?\n')
+        os.system('echo From a subprocess')
+
+    assert out == ['Capture the fd!', 'From a subprocess']
+    assert err == ['Rapture the fd?']
+    assert not out.spilled
+
+    with attest.capture_fd_output(spill_size=10) as (out, err):
+        os.write(1, 'spilled\n' * 100)
+
+    assert out.spilled and not err.spilled
+    assert out and not err
+    assert len(out) == 100
+    assert list(out) == ['spilled'] * 100
+    filename = out._filename
+    assert path.exists(filename)
+    del out
+    assert not path.exists(filename)
+
+
+@suite.test
+def captured_lines():
+    lines = attest.CapturedLines('one\ntwo\n')
+    assert lines == ['one', 'two']
+    assert lines != ['one']
+    assert ['one', 'two'] == lines
+    assert lines[-1] == 'two' and len(lines) == 2
+    assert repr(lines) == "['one', 'two']"
+    assert not attest.CapturedLines('')
+
+
+@suite.test
+def capture_limits():
+    with attest.capture_output(limit=20) as (out, err):
+        sys.stdout.write('0123456789' * 10)
+        sys.stdout.write('\nend')
+        print >>sys.stderr, 'short'
+
+    assert out == ['0123456789', '... [84 bytes truncated] ...',
+                   '456789', 'end']
+    assert err == ['short']
+
+    with attest.capture_output(max_lines=4) as (out, err):
+        for n in range(10):
+            print n
+
+    assert out == ['0', '1', '... [6 lines truncated] ...', '8', '9']
+
+    with attest.capture_output(limit=100) as (out, err):
+        assert not sys.stdout.isatty()
+        assert sys.stdout.encoding is None
+        with attest.raises(IOError):
+            sys.stdout.fileno()
+        sys.stdout.writelines(['one\n', 'two\n'])
+        sys.stdout.flush()
+
+    assert out == ['one', 'two']
+
+    with attest.capture_fd_output(limit=10, max_lines=3) as (out, err):
+        os.write(1, 'a' * 100 + '\n' + 'b' * 100)
+
+    assert out == ['aaaaa', '... [191 bytes truncated] ...', 'bbbbb']
+
+    lines = list(attest.truncate_lines(iter(range(5)), 3))
+    assert lines == [0, 1, '... [2 lines truncated] ...', 4]
+    lines = list(attest.truncate_lines(range(5), 0))
+    assert lines == ['... [5 lines truncated] ...']
+
+
+@suite.test
+def capture_threads():
+    import threading
+
+    def worker(name, started, done):
+        with attest.capture_output() as (out, err):
+            started.set()
+            print name
+            def child():
+                print 'child of', name
+            thread = threading.Thread(target=child)
+            thread.start()
+            thread.join()
+            done.wait()
+        results[name] = out
+
+    results = {}
+    stdout = sys.stdout
+    with attest.capture_output() as (out, err):
+        events = [threading.Event() for _ in range(4)]
+        threads = [threading.Thread(target=worker, args=(name, started, done))
+                   for name, started, done in
+                   (('one', events[0], events[1]),
+                    ('two', events[2], events[3]))]
+        for thread in threads:
+            thread.start()
+        events[0].wait()
+        events[2].wait()
+        print 'main'
+        # Both workers are inside their contexts now
+        events[1].set()
+        events[3].set()
+        for thread in threads:
+            thread.join()
+
+    assert out == ['main']
+    assert results['one'] == ['one', 'child of one']
+    assert results['two'] == ['two', 'child of two']
+    assert sys.stdout is stdout
+
+
+@suite.test
+def patched_thread_start():
+    import threading
+    from attest import contexts
+
+    # Tests already run with the wrapper installed, so install it again
+    start = vars(threading.Thread)['start']
+    started = []
+    def patched(thread):
+        started.append(thread)
+        return start(thread)
+    def other(thread):
+        return start(thread)
+
+    threading.Thread.start = patched
+    try:
+        # Replacements made before are called and put back
+        contexts._wrap_thread_start()
+        thread = threading.Thread(target=lambda: None)
+        thread.start()
+        thread.join()
+        assert started == [thread]
+        assert thread._attest_capture is contexts._current_capture()
+        contexts._unwrap_thread_start()
+        assert vars(threading.Thread)['start'] is patched
+
+        # Replacements made since are left alone
+        contexts._wrap_thread_start()
+        threading.Thread.start = other
+        contexts._unwrap_thread_start()
+        assert vars(threading.Thread)['start'] is other
+    finally:
+        threading.Thread.start = start
+
+
+@suite.test
+def capture_logging():
+    import logging
+    import threading
+
+    logger = logging.getLogger('attest.tests')
+    with attest.capture_logging() as log:
+        logger.warning('one %s', 'two')
+        logger.debug('hidden')
+        thread = threading.Thread(target=logger.error, args=('thread',))
+        thread.start()
+        thread.join()
+    assert log == ['WARNING attest.tests: one two',
+                   'ERROR attest.tests: thread']
+    assert [r.levelname for r in log.records] == ['WARNING', 'ERROR']
+
+    root = logging.getLogger()
+    level = root.level
+    with attest.capture_logging(logging.DEBUG, capacity=3) as log:
+        with attest.capture_logging(format='%(message)s') as inner:
+            logger.debug('inner')
+        for n in range(5):
+            logger.debug('%d', n)
+    assert inner == ['inner']
+    assert log == ['DEBUG attest.tests: 0', 'DEBUG attest.tests: 1',
+                   '... [2 records truncated] ...', 'DEBUG attest.tests: 4']
+    assert root.level == level
+
+    log.release()
+    assert not log.records
+    assert len(log) == 4
+
+    capacity = attest.contexts.LOG_CAPACITY
+    with attest.capture_logging() as log:
+        for n in range(capacity + 10):
+            logger.warning('%d', n)
+    assert len(log.records) == capacity and log.dropped == 10
+    assert log[-1] == 'WARNING attest.tests: %d' % (capacity + 9)
+
+    # Filters on the handler routing the records apply
+    with attest.capture_logging() as log:
+        attest.contexts._log_router.addFilter(
+            logging.Filter('attest.tests.kept'))
+        logging.getLogger('attest.tests.kept').warning('kept')
+        logger.warning('dropped')
+    assert log == ['WARNING attest.tests.kept: kept']
+
+
+@suite.test
+def soft_assertions():
+    """soft_assertions()"""
+
+    from attest.reporters import TestResult
+
+    reached = []
+    with attest.raises(attest.TestFailures) as error:
+        with attest.soft_assertions() as failures:
+            assert 1 + 1 == 3
+            reached.append(1)
+            with attest.soft_assertions():
+                assert [1] == [2]
+            assert 'a' == 'a'
+            attest.assert_all(bool, [1, 0])
+            reached.append(2)
+            count = len(failures)
+
+    assert reached == [1, 2]
+    assert count == 3
+    assert str(error) == '3 assertions failed'
+    failures = error.failures
+    assert error.value is failures[0].value
+    assert [str(f) for f in failures] == ['', '', '1 of 2 items failed']
+    lines = [f.location[1] for f in failures]
+    assert lines == sorted(lines)
+    assert path.basename(failures[0].location[0]).startswith('contexts.py')
+
+    result = TestResult(error=error.exc)
+    assertion = result.assertion.splitlines()
+    assert assertion[0].startswith('# ')
+    assert assertion[1:3] == ['assert ((1 + 1) == 3)', 'assert (2 == 3)']
+    assert 'assert ([1] == [2])' in assertion
+    assert result.equality_diff.splitlines()[1:] == [
+        'Items differ', '@@ [0] @@', '- 1', '+ 2']
+
+    with attest.soft_assertions() as failures:
+        assert True
+    assert failures == []
+
+    # Failures are kept with other exceptions and reported with them
+    with attest.raises(ValueError) as error:
+        with attest.soft_assertions():
+            assert False
+            with attest.soft_assertions():
+                assert 0
+                raise ValueError
+    assert len(error.soft_failures) == 2
+    result = TestResult(error=error.exc)
+    assert result.outcome == 'error'
+    assertion = result.assertion.splitlines()
+    assert 'assert False' in assertion and 'assert 0' in assertion
+
+    # Assertions in other threads aren't collected
+    import threading
+    raised = []
+    def child():
+        try:
+            assert False
+        except attest.TestFailure:
+            raised.append(True)
+    with attest.soft_assertions() as failures:
+        thread = threading.Thread(target=child)
+        thread.start()
+        thread.join()
+    assert raised == [True]
+    assert failures == []
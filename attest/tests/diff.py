@@ -0,0 +1,98 @@
+from attest import Tests, assert_hook, TestFailure
+from attest.diff import diff, Differences, MATCH_SIZE
+from attest.reporters import TestResult
+
+
+suite = Tests()
+
+
+@suite.test
+def sequences():
+    left = range(10)
+    right = left[:3] + [0] + left[4:]
+    assert diff(left, right) == 'Items differ\n@@ [3] @@\n- 3\n+ 0\n'
+    assert diff(left, left[:]) is None
+
+    right = left[:5] + ['x'] + left[7:]
+    assert diff(left, right).splitlines() == [
+        '10 != 9 items', '@@ [5:7] != [5:6] @@', '- 5', '- 6', "+ 'x'"]
+
+
+@suite.test
+def large_sequences():
+    left = range(MATCH_SIZE * 50)
+    right = left[:]
+    right[1] = right[-2] = None
+    lines = diff(left, right, limit=1).splitlines()
+    assert lines == ['Items differ', '@@ [1] @@', '- 1', '+ None',
+                     '<1 more differences>']
+
+    right.append(0)
+    lines = diff(left, right, limit=2).splitlines()
+    assert lines[:2] == ['50000 != 50001 items',
+                         '@@ [1:50000] != [1:50001] @@']
+    assert lines[-2:] == ['+ 2', '+ <49998 more>']
+
+
+@suite.test
+def eq_only():
+    # On Python 2 != isn't derived from __eq__
+    class P(object):
+        def __init__(self, x):
+            self.x = x
+        def __eq__(self, other):
+            return self.x == other.x
+        def __repr__(self):
+            return 'P(%d)' % self.x
+
+    assert diff([P(1), P(2)], [P(1), P(3)]).splitlines() == [
+        'Items differ', '@@ [1] @@', '- P(2)', '+ P(3)']
+    assert diff(dict(a=P(1), b=P(2)), dict(a=P(1), b=P(3))).splitlines() == [
+        'Dicts differ', "@@ ['b'] @@", '- P(2)', '+ P(3)']
+
+
+@suite.test
+def dicts_and_sets():
+    lines = diff(dict(a=1, b=2), dict(b=3, c=4)).splitlines()
+    assert lines[0] == 'Dicts differ'
+    assert sorted(lines[1:]) == sorted(["@@ ['a'] @@", '- 1',
+                                        "@@ ['b'] @@", '- 2', '+ 3',
+                                        "@@ ['c'] @@", '+ 4'])
+
+    assert diff(set([1, 2]), set([2, 3])).splitlines() == [
+        '1 only on the left, 1 only on the right',
+        '@@ left - right @@', '- 1', '@@ right - left @@', '+ 3']
+
+
+@suite.test
+def strings():
+    left = 'a' * 100 + 'b' + 'c' * 100
+    right = 'a' * 100 + 'x' + 'c' * 100
+    lines = diff(left, right).splitlines()
+    assert lines[:2] == ['First difference at index 100',
+                         '@@ [100:101] != [100:101] @@']
+    assert lines[2] == '- %r' % ('a' * 30 + 'b' + 'c' * 30)
+
+    lines = diff('one\ntwo\n', 'one\n2\n').splitlines()
+    assert lines == ['Lines differ', '@@ [1] @@', '- two', '+ 2']
+
+    assert diff('a', u'b') is None
+    assert diff(1, 2) is None
+
+
+@suite.test
+def timeout():
+    differences = Differences(timeout=-1)
+    assert differences.expired
+    lines = diff(range(5000), range(1, 5001), timeout=-1).splitlines()
+    assert lines == ['Items differ', '<stopped after -1.0 seconds>']
+
+
+@suite.test
+def result_diff():
+    left, right = [1, 2], [1, 3]
+    try:
+        assert left == right
+    except TestFailure, e:
+        result = TestResult(error=e)
+    assert result.equality_diff == 'Items differ\n@@ [1] @@\n- 2\n+ 3\n'
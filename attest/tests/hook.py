@@ -1,3 +1,5 @@
+from __future__ import with_statement
+
 from attest import Tests, assert_hook
 from attest.hook import ExpressionEvaluator
 
@@ -31,3 +33,338 @@ def initpy_with_relative_import():
     # Ensure that packages with an __init__.py file that use both assert_hook
     # and relative imports are hooked properly.
     from . import dummy
+
+
+@suite.test
+def rewritten_assert():
+    from attest import statistics, TestFailure, raises
+    from attest.hook import AssertTransformer
+
+    source = '\n'.join([
+        '"""Docstring."""',
+        'from __future__ import with_statement',
+        'from attest import assert_hook',
+        'calls = []',
+        'def check(value):',
+        '    calls.append(value)',
+        '    return value',
+        'def test(value):',
+        '    assert check(value) == 1, "message %d" % value',
+        'def short(value):',
+        '    assert value and 0 < check(value) < 3',
+    ])
+    transformer = AssertTransformer(source, '<rewritten>')
+    namespace = {}
+    exec transformer.code in namespace
+    assert namespace['__doc__'] == 'Docstring.'
+
+    assertions = statistics.assertions
+    namespace['test'](1)
+    counted = statistics.assertions - assertions
+    assert counted == 1
+    assert namespace['calls'] == [1]
+
+    with raises(TestFailure) as error:
+        namespace['test'](2)
+    assert str(error) == 'message 2'
+    assert repr(error.value) == '(2 == 1)'
+    # The failing test was evaluated only once
+    assert namespace['calls'] == [1, 2]
+
+    with raises(TestFailure) as error:
+        namespace['short'](0)
+    assert repr(error.value) == '(0 and (0 < check(value) < 3))'
+    with raises(TestFailure) as error:
+        namespace['short'](5)
+    assert repr(error.value) == '(5 and (0 < 5 < 3))'
+    assert not error.value
+    assert namespace['calls'] == [1, 2, 5]
+
+
+@suite.test
+def rewritten_assert_namespaces():
+    from attest import TestFailure, raises
+    from attest.hook import AssertTransformer
+
+    def temporaries(namespace):
+        return [name for name in namespace
+                if name.startswith(('__attest_value', '__attest_result'))]
+
+    source = '\n'.join([
+        'from attest import assert_hook',
+        'value = 1',
+        'assert value == 1 and value + 1 == 2',
+        'class K(object):',
+        '    assert value + 1 == 2',
+        'def test():',
+        '    class L(object):',
+        '        assert value in [value]',
+        '    return L',
+        'L = test()',
+    ])
+    namespace = {}
+    exec AssertTransformer(source, '<namespaces>').code in namespace
+    assert temporaries(namespace) == []
+    assert temporaries(vars(namespace['K'])) == []
+    assert temporaries(vars(namespace['L'])) == []
+
+    source = 'from attest import assert_hook\nvalue = 1\nassert value == 2\n'
+    namespace = {}
+    with raises(TestFailure) as error:
+        exec AssertTransformer(source, '<failing>').code in namespace
+    assert repr(error.value) == '(1 == 2)'
+    assert temporaries(namespace) == []
+
+
+@suite.test
+def multiline_assert():
+    import sys, traceback
+    from attest import TestFailure
+
+    try:
+        assert [1] == [1,
+                       2]
+    except TestFailure:
+        tb = sys.exc_info()[2]
+    lines = [text for filename, lineno, name, text
+             in traceback.extract_tb(tb) if name == 'multiline_assert']
+    assert lines == ['assert [1] == [1,']
+
+
+@suite.test
+def expression_cache():
+    from attest import hook
+
+    value = 2
+    first = ExpressionEvaluator('value == 2', globals(), locals())
+    second = ExpressionEvaluator('value == 2', globals(), locals())
+    assert first and second
+    assert first.node is second.node
+    assert ('value == 2', '<assert %s>' % __file__) in hook._code_cache
+    # Closures see the locals
+    assert ExpressionEvaluator('[v for v in (value,) if value]',
+                               globals(), locals())
+    assert ExpressionEvaluator('all(v == value for v in [2])',
+                               globals(), locals())
+
+    hook._code_cache.clear()
+    for n in range(hook.CACHE_SIZE + 1):
+        bool(ExpressionEvaluator(str(n), {}, {}))
+    assert len(hook._code_cache) <= hook.CACHE_SIZE
+
+
+@suite.test
+def cached_rewrite():
+    import sys
+    from os import path
+    from attest import hook, tempdir, raises, TestFailure, AssertImportHook
+
+    def write(d, source):
+        with open(path.join(d, 'cached_module.py'), 'w') as f:
+            f.write('from attest import assert_hook\n')
+            f.write(source)
+
+    def load():
+        sys.modules.pop('cached_module', None)
+        with AssertImportHook():
+            import cached_module
+        return cached_module
+
+    def should_rewrite(self):
+        raise AssertionError('not cached')
+
+    dont_write_bytecode = getattr(sys, 'dont_write_bytecode', False)
+    sys.dont_write_bytecode = False
+    try:
+        with tempdir() as d:
+            sys.path.insert(0, d)
+            try:
+                write(d, 'def test(): assert 1 == 2\n')
+                module = load()
+                filename = hook.cache_filename(module.__file__)
+                assert path.exists(filename)
+                assert hook.read_cached_code(module.__file__) is not None
+
+                # Changing the rewriter invalidates the cache
+                checksum = hook._rewriter_checksum
+                hook._rewriter_checksum = checksum ^ 1
+                try:
+                    assert hook.read_cached_code(module.__file__) is None
+                finally:
+                    hook._rewriter_checksum = checksum
+
+                transformer = hook.AssertTransformer
+                original = transformer.should_rewrite
+                transformer.should_rewrite = property(should_rewrite)
+                try:
+                    module = load()
+                finally:
+                    transformer.should_rewrite = original
+                with raises(TestFailure):
+                    module.test()
+
+                # Changing the size of the source invalidates the cache
+                write(d, 'def test(): assert 1 == 22\n')
+                assert hook.read_cached_code(module.__file__) is None
+                module = load()
+                with raises(TestFailure) as error:
+                    module.test()
+                assert repr(error.value) == '(1 == 22)'
+            finally:
+                sys.path.remove(d)
+                sys.modules.pop('cached_module', None)
+    finally:
+        sys.dont_write_bytecode = dont_write_bytecode
+
+
+@suite.test
+def single_parse():
+    from attest import hook
+
+    parse = hook.ast.parse
+    parsed = []
+    def counting_parse(*args, **kwargs):
+        parsed.append(args[0])
+        return parse(*args, **kwargs)
+
+    source = 'from attest import assert_hook\nassert 1 == 1\n'
+    transformer = hook.AssertTransformer(source, '<single>')
+    hook.ast.parse = counting_parse
+    try:
+        assert transformer.should_rewrite
+        code = transformer.code
+        assert transformer.code is code
+        assert transformer.node is transformer.node
+    finally:
+        hook.ast.parse = parse
+    assert parsed == [source]
+
+
+@suite.test
+def scoped_hook():
+    from attest import AssertImportHook
+
+    hook = AssertImportHook(prefixes=['attest.tests', 'other'])
+    assert hook.in_scope('attest.tests')
+    assert hook.in_scope('attest.tests.dummy')
+    assert hook.in_scope('other.module')
+    assert not hook.in_scope('attest.testsuite')
+    assert not hook.in_scope('attest')
+    assert not hook.in_scope('os')
+    assert hook.find_module('os') is None
+    assert AssertImportHook().find_module('os') is not None
+
+
+@suite.test
+def hooked_import():
+    import sys
+    from attest import AssertImportHook
+
+    names = ['attest.tests.dummy', 'attest.tests.dummy.foo']
+    modules = dict((name, sys.modules.pop(name, None)) for name in names)
+    try:
+        with AssertImportHook(cache=False, prefixes=names[:1]):
+            from attest.tests import dummy
+        assert '__attest_statistics__' in vars(dummy)
+    finally:
+        for name, module in modules.items():
+            if module is not None:
+                sys.modules[name] = module
+
+
+@suite.test
+def visitor_dispatch():
+    from attest import ast
+
+    class Names(ast.NodeVisitor):
+        def __init__(self):
+            self.names = []
+        def visit_Name(self, node):
+            self.names.append(node.id)
+
+    class Upper(Names):
+        def visit_Name(self, node):
+            self.names.append(node.id.upper())
+
+    class Custom(Names):
+        def get_visitor(self, node):
+            if isinstance(node, ast.Num):
+                return lambda node: self.names.append(node.n)
+
+    tree = ast.parse('a + b * 2')
+    for cls, names in ((Names, ['a', 'b']), (Upper, ['A', 'B']),
+                       (Custom, [2]), (Names, ['a', 'b'])):
+        visitor = cls()
+        visitor.visit(tree)
+        assert visitor.names == names
+
+    # Visitor methods of instances are respected
+    visitor = Names()
+    visitor.visit_Name = lambda node: visitor.names.append(node.id * 2)
+    visitor.visit(tree)
+    assert visitor.names == ['aa', 'bb']
+
+    # Visitor methods assigned to classes after the lookup are respected
+    def visit_Name(self, node):
+        self.names.append(node.id + '!')
+    Names.visit_Name = visit_Name
+    for cls, names in ((Names, ['a!', 'b!']), (Upper, ['A', 'B'])):
+        visitor = cls()
+        visitor.visit(tree)
+        assert visitor.names == names
+    del Upper.visit_Name
+    visitor = Upper()
+    visitor.visit(tree)
+    assert visitor.names == ['a!', 'b!']
+
+
+@suite.test
+def memoized_source():
+    from attest import ast, hook
+
+    node = ast.parse('a + b', mode='eval').body
+    source = hook._source(node)
+    assert source == '(a + b)'
+    assert node._attest_source is source
+    assert hook._source(node) is source
+
+
+@suite.test
+def assert_all():
+    from attest import TestFailure, assert_all, statistics, raises
+
+    def even(n):
+        return not n % 2
+
+    assertions = statistics.assertions
+    assert_all(even, xrange(0, 2000, 2))
+    counted = statistics.assertions - assertions
+    assert counted == 1000
+
+    with raises(TestFailure) as error:
+        assert_all(even, [0, 1, 2, 3, 5], limit=2)
+    assert str(error.exc) == '3 of 5 items failed'
+    assert str(error.value).splitlines() == [
+        'even(item)', 'even(1)  # [1]', 'even(3)  # [3]', '# <1 more>']
+
+    with raises(TestFailure) as error:
+        assert_all(lambda n: n, [0])
+    assert error.value.expr == 'predicate(item)'
+
+
+@suite.test
+def evaluation_filename():
+    import sys, traceback
+
+    def boom():
+        raise ValueError('boom')
+
+    line = sys._getframe().f_lineno + 2
+    try:
+        assert_hook('boom() == 1')
+    except ValueError:
+        tb = sys.exc_info()[2]
+    # The frame of the expression, which called boom()
+    filename, lineno, name, text = traceback.extract_tb(tb)[-2]
+    assert filename == '<assert %s:%d>' % (__file__, line)
+    assert (lineno, text) == (1, None)
@@ -0,0 +1,78 @@
+from __future__ import with_statement
+
+from os import path
+from StringIO import StringIO
+
+from attest import Tests, assert_hook, raises
+import attest
+from attest import merge
+
+from . import _meta
+
+
+suite = Tests()
+
+
+def write_xunit(filename):
+    with attest.capture_output():
+        with raises(SystemExit):
+            _meta.suite.run(attest.XUnitReporter(file=filename))
+
+
+@suite.test
+def read_xunit():
+    with attest.tempdir() as d:
+        filename = path.join(d, 'results.xml')
+        write_xunit(filename)
+        records = list(merge.read_results(filename))
+
+    assert [r['name'] for r in records] == ['attest.tests._meta.passing',
+                                            'attest.tests._meta.failing']
+    assert [r['outcome'] for r in records] == ['success', 'failure']
+    assert records[1]['type'] == 'TestFailure'
+    assert records[1]['traceback'].startswith('Traceback')
+    assert records[1]['stdout'] == ['stdout']
+    assert records[1]['stderr'] == ['stderr']
+
+
+@suite.test
+def merge_shards():
+    with attest.tempdir() as d:
+        write_xunit(path.join(d, 'one.xml'))
+        write_xunit(path.join(d, 'two.xml'))
+        with open(path.join(d, 'three.jsonl'), 'w') as f:
+            merge.JsonLinesWriter(f).write(dict(name='shard.test',
+                                                outcome='error', time=1.5,
+                                                type='ValueError',
+                                                message="ValueError()",
+                                                traceback='Traceback'))
+
+        out = StringIO()
+        counts = merge.merge([d], out)
+        assert counts == dict(success=2, failure=2, error=1)
+
+        with open(path.join(d, 'merged.xml'), 'w') as f:
+            f.write(out.getvalue())
+        records = list(merge.read_results(path.join(d, 'merged.xml')))
+
+    assert len(records) == 5
+    # Directories are scanned in sorted order: one, three, two
+    assert [r['name'] for r in records[:2]] == \
+           [r['name'] for r in records[3:]]
+    assert records[2]['name'] == 'shard.test'
+    assert records[2]['time'] == 1.5
+
+    header = out.getvalue().splitlines()[1]
+    assert 'tests="5" errors="1" failures="2"' in header
+
+
+@suite.test
+def jsonl_output():
+    with attest.tempdir() as d:
+        write_xunit(path.join(d, 'results.xml'))
+        out = StringIO()
+        merge.merge([d], out, format='jsonl')
+        out.seek(0)
+        records = list(merge.read_jsonl(out))
+
+    assert [r['outcome'] for r in records] == ['success', 'failure']
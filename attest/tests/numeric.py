@@ -0,0 +1,137 @@
+from __future__ import with_statement
+
+from attest import Tests, assert_hook, TestFailure, approx, raises
+from attest.numeric import mismatches
+from attest.reporters import TestResult
+from attest.saferepr import saferepr
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+suite = Tests()
+
+
+@suite.test
+def approx_numbers():
+    assert 0.1 + 0.2 == approx(0.3)
+    assert 0.1 + 0.2 != approx(0.31)
+    assert 1.001 == approx(1, rel=1e-2)
+    assert 1.001 != approx(1, rel=0, abs=1e-4)
+    assert [0.1 + 0.2, 1] == approx([0.3, 1])
+    assert (0.3,) != approx([0.3, 1])
+    assert dict(a=0.1 + 0.2) == approx(dict(a=0.3))
+    assert dict(b=0.3) != approx(dict(a=0.3))
+    assert float('nan') != approx(float('nan'))
+    assert float('nan') == approx(float('nan'), nan_equal=True)
+    assert repr(approx([1, 2])) == 'approx([1, 2])'
+
+
+@suite.test
+def approx_diff():
+    try:
+        assert [1.0, 2.0] == approx([1.0, 2.1])
+    except TestFailure, e:
+        result = TestResult(error=e)
+    assert result.equality_diff == 'Items differ\n@@ [1] @@\n- 2.0\n+ 2.1\n'
+
+
+@suite.test_if(numpy)
+def array_mismatches():
+    left = numpy.arange(10000.0).reshape(100, 100)
+    right = left.copy()
+    right[1, 2] += 0.5
+    right[50, 0] = numpy.nan
+
+    found = mismatches(left, right)
+    assert found.count == 2
+    assert found.size == 10000
+    assert found.fraction == 0.0002
+    assert found.max_abs == 0.5
+    assert found.indices == [(1, 2), (50, 0)]
+    assert not mismatches(left, left.copy())
+
+    assert mismatches(left, right, abs=1).indices == [(50, 0)]
+    assert not mismatches(right, right.copy(), nan_equal=True)
+    found = mismatches(left, left[:50])
+    assert found.shapes == ((100, 100), (50, 100))
+
+    # Differences of unsigned and small integers don't wrap around
+    found = mismatches(numpy.array([1, 5], numpy.uint8),
+                       numpy.array([2, 5], numpy.uint8))
+    assert (found.count, found.max_abs, found.max_rel) == (1, 1, 0.5)
+    found = mismatches(numpy.array([-128], numpy.int8),
+                       numpy.array([127], numpy.int8))
+    assert found.max_abs == 255
+    assert numpy.array([1], numpy.uint8) != approx(numpy.array([2],
+                                                               numpy.uint8))
+
+    assert left == approx(left * (1 + 1e-9))
+    assert not left == approx(right)
+    assert left != approx(right)
+
+
+@suite.test_if(numpy)
+def array_explanations():
+    left = numpy.arange(100000.0)
+    right = left.copy()
+    right[5] = -1
+    try:
+        assert left == approx(right)
+    except TestFailure, e:
+        result = TestResult(error=e)
+
+    lines = result.equality_diff.splitlines()
+    assert lines == ['1 of 100000 elements differ (0.001%)',
+                     'Largest absolute difference: 6',
+                     'Largest relative difference: 6',
+                     '@@ [5] @@', '- 5.0', '+ -1.0']
+    assert len(result.assertion) < 1000
+    assert saferepr(left) == \
+        'array([0.0000e+00, 1.0000e+00, 2.0000e+00, ..., ' \
+        '9.9997e+04, 9.9998e+04,\n       9.9999e+04])'
+
+
+@suite.test_if(numpy)
+def array_asserts():
+    left = numpy.arange(10.0)
+    right = left.copy()
+    assert left == right
+    assert_hook('left == right')
+
+    right[3] = -1
+    with raises(TestFailure) as error:
+        assert left == right
+    assert TestResult(error=error.exc).equality_diff.splitlines() == [
+        '1 of 10 elements differ (10%)',
+        'Largest absolute difference: 4',
+        'Largest relative difference: 4',
+        '@@ [3] @@', '- 3.0', '+ -1.0']
+    with raises(TestFailure):
+        assert_hook('left == right')
+
+
+@suite.test_if(numpy)
+def assert_all_arrays():
+    from attest import assert_all, statistics
+
+    calls = []
+    def positive(a):
+        calls.append(a)
+        return a > 0
+
+    values = numpy.arange(1, 10001).reshape(100, 100)
+    assertions = statistics.assertions
+    assert_all(positive, values)
+    counted = statistics.assertions - assertions
+    assert counted == 10000
+    assert len(calls) == 1
+
+    values[3, 4] = values[50, 0] = 0
+    with raises(TestFailure) as error:
+        assert_all(positive, values)
+    assert str(error.exc) == '2 of 10000 items failed'
+    assert str(error.value).splitlines()[1:] == ['positive(0)  # [3, 4]',
+                                                 'positive(0)  # [50, 0]']
@@ -0,0 +1,77 @@
+from __future__ import with_statement
+
+import os
+import sys
+from os import path
+
+from attest import Tests, assert_hook, hook
+import attest
+from attest import precompile
+
+
+suite = Tests()
+
+
+@suite.test
+def compile_tree():
+    with attest.tempdir() as d:
+        package = path.join(d, 'package')
+        os.mkdir(package)
+        os.mkdir(path.join(package, '.hidden'))
+        sources = {'__init__.py': '',
+                   'test_one.py': 'from attest import assert_hook\n'
+                                  'assert True\n',
+                   'test_two.py': 'from attest import assert_hook\n'
+                                  'assert True, "two"\n',
+                   'broken.py': 'from attest import assert_hook\nassert (\n',
+                   '.hidden/test_three.py': 'from attest import assert_hook\n'}
+        for name, source in sources.iteritems():
+            with open(path.join(package, name), 'w') as f:
+                f.write(source)
+
+        assert list(precompile.iter_sources([d])) == [
+            path.join(package, name) for name in
+            ('__init__.py', 'broken.py', 'test_one.py', 'test_two.py')]
+
+        failed = []
+        with attest.capture_output():
+            counts = precompile.compile_paths([d], processes=2,
+                errors=lambda filename, message: failed.append(filename))
+        assert counts == dict(compiled=2, cached=0, skipped=1, failed=1)
+        assert failed == [path.join(package, 'broken.py')]
+        for name in ('test_one.py', 'test_two.py'):
+            filename = path.join(package, name)
+            assert path.exists(hook.cache_filename(filename))
+            assert hook.read_cached_code(filename) is not None
+
+        counts = precompile.compile_paths([package], processes=1)
+        assert counts == dict(compiled=0, cached=2, skipped=1, failed=1)
+
+
+@suite.test
+def compiled_filenames():
+    # The import hook and attest compile share the cache, and compile
+    # under the same name
+    def load(name):
+        sys.modules.pop(name, None)
+        with attest.AssertImportHook(cache=False):
+            module = __import__(name)
+        del sys.modules[name]
+        return module.test.func_code.co_filename
+
+    cwd = os.getcwd()
+    with attest.tempdir() as d:
+        with open(path.join(d, 'compiled_module.py'), 'w') as f:
+            f.write('from attest import assert_hook\n'
+                    'def test(): assert True\n')
+        filename = path.join(path.realpath(d), 'compiled_module.py')
+        os.chdir(d)
+        sys.path.insert(0, '')
+        try:
+            assert load('compiled_module') == filename
+            precompile.compile_file('compiled_module.py')
+            code = hook.read_cached_code(filename)
+            assert code.co_filename == filename
+        finally:
+            sys.path.remove('')
+            os.chdir(cwd)
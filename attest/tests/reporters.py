@@ -21,7 +21,8 @@ suite = Tests()
 
 @suite.test
 def get_all_reporters():
-    reporters = set(['auto', 'fancy', 'plain', 'xml', 'quickfix', 'xunit'])
+    reporters = set(['auto', 'fancy', 'plain', 'xml', 'quickfix', 'xunit',
+                     'resultlog'])
     assert set(attest.get_all_reporters()) == reporters
 
 
@@ -110,6 +111,105 @@ def quickfix_reporter():
     assert out == ['%s:%d: TestFailure' % (SOURCEFILE, LINENO)]
 
 
+@suite.test
+def quickfix_without_traceback():
+    from attest.reporters import TestResult
+
+    result = TestResult.from_dict({
+        'name': __name__ + '.quickfix_reporter', 'test': 'quickfix_reporter',
+        'outcome': 'error', 'type': 'ValueError', 'message': u'caf\xe9'})
+    assert result.raw_traceback == []
+    with attest.capture_output() as (out, err):
+        attest.QuickFixReporter().failure(result)
+    filename = inspect.getsourcefile(sys.modules[__name__])
+    assert out == ['%s:0: ValueError: caf\xc3\xa9' % filename]
+
+
 @suite.test
 def empty_run_zero_division_regression():
     Tests().run(attest.FancyReporter)
+
+
+@suite.test
+def result_properties_memoized():
+    try:
+        1 / 0
+    except ZeroDivisionError, e:
+        result = attest.TestResult(test=_meta.passing, error=e,
+                                   exc_info=sys.exc_info())
+
+    traceback = result.traceback
+    assert traceback.endswith('ZeroDivisionError: %s' % e)
+    assert result.traceback is traceback
+    assert result.raw_traceback is result.raw_traceback
+    assert result.test_name == 'attest.tests._meta.passing'
+
+    assert result.stdout is None and result.time is None
+    with attest.raises(AttributeError):
+        result.anything = True
+
+
+@suite.test_if(COMPILES_AST)
+def result_wire_format():
+    import pickle
+    from .collectors import TestReporter
+
+    collected = TestReporter()
+    _meta.suite.run(collected)
+    results = collected.succeeded + collected.failed
+
+    for result in results:
+        data = result.to_dict()
+        copy = attest.TestResult.from_dict(data)
+        assert copy.to_dict() == data
+        copy = pickle.loads(pickle.dumps(result))
+        assert copy.to_dict() == data
+
+    failure = pickle.loads(pickle.dumps(collected.failed[0]))
+    assert failure.test_name == 'attest.tests._meta.failing'
+    assert failure.test.__name__ == 'failing'
+    assert failure.outcome == 'failure'
+    assert isinstance(failure.error, TestFailure)
+    assert failure.assertion == 'assert (value == 3)\nassert (2 == 3)'
+    assert failure.stdout == ['stdout']
+
+    def report(results):
+        reporter = attest.PlainReporter()
+        with attest.capture_output() as (out, err):
+            reporter.begin(results)
+            for result in results:
+                if result.error is None:
+                    reporter.success(result)
+                else:
+                    reporter.failure(result)
+            with Assert.raises(SystemExit):
+                reporter.finished()
+        # Leave out the assertion count
+        return out[:-1]
+
+    assert report(results) == report(map(attest.TestResult.from_dict,
+                                         [r.to_dict() for r in results]))
+
+    error = attest.TestResult.from_dict(dict(
+        name='remote.test', outcome='error', type='CustomError',
+        message='oops', traceback=(
+            'Traceback (most recent call last):\n'
+            '  File "remote.py", line 3, in test\n'
+            '    raise CustomError("oops")\n'
+            'CustomError: oops')))
+    assert type(error.error).__name__ == 'CustomError'
+    assert not isinstance(error.error, AssertionError)
+    assert error.raw_traceback == [('remote.py', 3, 'test',
+                                    'raise CustomError("oops")')]
+    assert str(error.error) == 'oops'
+    with attest.raises(RuntimeError):
+        error.test()
+
+    try:
+        raise ValueError(u'caf\xe9')
+    except ValueError, e:
+        result = attest.TestResult(test=_meta.passing, error=e,
+                                   exc_info=sys.exc_info())
+    data = result.to_dict()
+    assert data['message'] == u'caf\xe9'
+    assert data['traceback'].endswith('ValueError: caf\\xe9')
@@ -0,0 +1,105 @@
+from __future__ import with_statement
+
+from os import path
+from StringIO import StringIO
+
+from attest import Tests, assert_hook, raises
+import attest
+from attest import merge, resultlog
+
+from . import _meta
+
+
+suite = Tests()
+
+
+def write_log(filename):
+    with attest.capture_output():
+        with raises(SystemExit):
+            _meta.suite.run(attest.ResultLogReporter(file=filename))
+
+
+@suite.test
+def round_trip():
+    with attest.tempdir() as d:
+        filename = path.join(d, 'results.log')
+        write_log(filename)
+        records = list(attest.ResultLog(filename))
+
+    assert [r['name'] for r in records] == ['attest.tests._meta.passing',
+                                            'attest.tests._meta.failing']
+    passing, failing = records
+    assert passing['outcome'] == 'success' and passing['traceback'] is None
+    assert failing['outcome'] == 'failure'
+    assert failing['type'] == 'TestFailure'
+    assert failing['traceback'].startswith('Traceback')
+    assert failing['stdout'] == ['stdout']
+    assert failing['stderr'] == ['stderr']
+
+
+@suite.test
+def passing_output():
+    col = Tests()
+
+    @col.test
+    def noisy():
+        print 'noise'
+
+    with attest.tempdir() as d:
+        filename = path.join(d, 'results.log')
+        with attest.capture_output():
+            col.run(attest.ResultLogReporter(file=filename))
+        record, = attest.ResultLog(filename)
+    assert record['outcome'] == 'success'
+    assert record['stdout'] == []
+
+
+@suite.test
+def append_and_aggregate():
+    with attest.tempdir() as d:
+        filename = path.join(d, 'results.log')
+        write_log(filename)
+        size = path.getsize(filename)
+        write_log(filename)
+        # Names are interned, so later sessions don't add much
+        assert path.getsize(filename) < size * 2 + 16
+
+        log = attest.ResultLog(filename)
+        totals = log.totals()
+        assert totals['success'] == 2 and totals['failure'] == 2
+        assert totals['error'] == 0
+
+        failures = list(log.filter(outcome='failure'))
+        assert len(failures) == 2
+        assert list(log.filter(name='attest.tests._meta.pass'))
+        assert not list(log.filter(name='nothing'))
+
+        out = StringIO()
+        log.to_xunit(out)
+        assert 'tests="4" errors="0" failures="2"' in out.getvalue()
+
+        out = StringIO()
+        merge.merge([filename], out, format='jsonl')
+        assert len(out.getvalue().splitlines()) == 4
+
+
+@suite.test
+def long_strings():
+    with attest.tempdir() as d:
+        filename = path.join(d, 'results.log')
+        with open(filename, 'wb') as f:
+            writer = resultlog.ResultLogWriter(f)
+            record = dict(name='test', outcome='error', time=0.5,
+                          type='ValueError', message='ValueError()',
+                          traceback='x' * 10000, stdout=['a', 'b'],
+                          stderr=[])
+            writer.write(record)
+            writer.write(record)
+            writer.close()
+
+        assert list(attest.ResultLog(filename)) == [record, record]
+
+        with open(filename, 'wb') as f:
+            f.write('garbage')
+        with raises(ValueError):
+            list(attest.ResultLog(filename))
@@ -0,0 +1,64 @@
+from __future__ import with_statement
+
+from attest import Tests, assert_hook, TestFailure, raises
+from attest.saferepr import SafeRepr, saferepr
+
+
+suite = Tests()
+
+
+class Broken(object):
+
+    def __repr__(self):
+        raise ValueError('broken')
+
+
+@suite.test
+def small_values():
+    values = [1, 'two', [3, (4,)], set([5]), {6: None}, u'seven', 8.5]
+    for value in values:
+        assert saferepr(value) == repr(value)
+
+
+@suite.test
+def bounded_values():
+    assert saferepr(range(1000)).endswith(', 99, <900 more>]')
+    assert saferepr(dict.fromkeys(range(100))).endswith(', <50 more>}')
+    assert saferepr([[[[[[[[1]]]]]]]]) == '[[[[[[[...]]]]]]]'
+
+    rendered = saferepr('x' * 5000)
+    assert len(rendered) == 1000
+    assert '...' in rendered
+
+    rendered = saferepr([['x' * 900] * 100] * 100, maxsize=200)
+    assert len(rendered) == 200
+
+
+@suite.test
+def timeout():
+    rendered = saferepr(range(100), timeout=-1)
+    assert rendered == '[<100 more>]'
+
+    reprs = SafeRepr(timeout=None)
+    assert reprs.repr(range(3)) == '[0, 1, 2]'
+    assert reprs.deadline is None
+
+
+@suite.test
+def broken_repr():
+    obj = Broken()
+    rendered = saferepr([obj])
+    assert rendered == '[<[ValueError raised in repr()] ' \
+                       'Broken object at 0x%x>]' % id(obj)
+
+
+@suite.test
+def assertion_values():
+    data = range(10000)
+    obj = Broken()
+    with raises(TestFailure) as error:
+        assert data == obj
+    rendered = repr(error.value)
+    assert rendered.startswith('([0, 1, 2')
+    assert '<9900 more>' in rendered
+    assert 'ValueError raised in repr()' in rendered
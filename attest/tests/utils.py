@@ -45,11 +45,13 @@ def string_importing():
 @suite.test
 def iter_mods():
     core = ['attest'] + ['attest.' + mod for mod in
-            '''ast codegen collectors contexts deprecated hook __main__
-               reporters run statistics utils pygments'''.split()]
+            '''ast codegen collectors contexts deprecated diff hook __main__
+               merge numeric precompile reporters resultlog run saferepr
+               statistics utils pygments'''.split()]
     tests = ['attest.tests'] + ['attest.tests.' + mod for mod in
-            '''asserts classy collectors contexts hook _meta reporters utils
-               dummy dummy.foo'''.split()]
+            '''asserts classy collectors contexts diff hook _meta merge numeric
+               precompile reporters resultlog saferepr utils dummy
+               dummy.foo'''.split()]
 
     found = list(utils.deep_iter_modules('attest'))
     expected = core + tests
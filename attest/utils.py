@@ -13,7 +13,8 @@ __all__ = ['get_terminal_size',
            'deep_get_members',
            'parse_options',
            'nested',
-           'counter']
+           'counter',
+           'memoized_property']
 
 
 def get_terminal_size(default=(80, 24)):
@@ -164,3 +165,29 @@ class counter(dict):
         else:
             self[key] += 1
         return self[key]
+
+
+class memoized_property(object):
+    """Like :func:`property` but only calls the getter the first time the
+    attribute is accessed, storing the value in the ``_memo`` dictionary of
+    the instance. This works with classes using ``__slots__`` as long as
+    they provide a ``_memo`` slot.
+
+    .. versionadded:: 0.6
+
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        memo = instance._memo
+        try:
+            return memo[self.__name__]
+        except KeyError:
+            value = memo[self.__name__] = self.func(instance)
+            return value
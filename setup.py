@@ -53,6 +53,7 @@ setup(
             'xml = attest:XmlReporter',
             'xunit = attest:XUnitReporter',
             'quickfix = attest:QuickFixReporter',
+            'resultlog = attest:ResultLogReporter',
             'plain = attest:PlainReporter',
             'fancy = attest:FancyReporter',
             'auto = attest:auto_reporter',